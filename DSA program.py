@@ -4,11 +4,40 @@
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import sqlite3
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
+from array import array
+from bisect import bisect_left, insort
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http import HTTPStatus
+import argparse
+import asyncio
+import csv
+import functools
+import heapq
+import hmac
+import http.client
+import itertools
+import json
+import multiprocessing
 import os
+import queue
+import random
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from urllib.parse import parse_qs, urlencode, urlsplit
 
 DB_NAME = "gilded_fork_enterprise.db"
 THEME_COLOR = "#2C3E50"
@@ -17,13 +46,1211 @@ BG_COLOR = "#ECF0F1"
 FONT_MAIN = ("Helvetica", 10)
 FONT_HEADER = ("Helvetica", 14, "bold")
 TAX_RATE = 0.08
+CHANGE_POLL_MS = 50
+JOURNAL_MODE = "WAL"
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16384
+INVENTORY_FLUSH_BATCH = 50
+INVENTORY_FLUSH_MS = 30000
+RECEIPT_DIR = "receipts"
+ARCHIVE_DIR = "archive"
+ARCHIVE_AFTER_DAYS = 90
+REPORT_DIR = "reports"
+RESERVATION_MINUTES = 90
+RESERVATION_HOLD_MINUTES = 30
+RESERVATION_NOSHOW_MINUTES = 20
+RESERVATION_CHECK_MS = 60000
+MAX_COMBINED_TABLES = 3
+EVENT_LOG_KEEP = 10000
+BULK_BATCH = 1000
+SLOW_QUERY_MS = 50
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_WORKERS = 8
+KITCHEN_DEFAULTS = {"Appetizers": ("Cold", 1, 6), "Mains": ("Grill", 2, 14), "Desserts": ("Cold", 3, 5),
+                    "Beverages": ("Bar", 0, 2), "Alcohol": ("Bar", 0, 2)}
+STATION_COOKS = {"Grill": 2, "Cold": 1, "Bar": 1, "Line": 1}
+COURSE_GAP_MINUTES = 10
+KITCHEN_LATE_MINUTES = 20
+KITCHEN_TICK_MS = 30000
+PASSWORD_ITERATIONS = 200000
+PASSWORD_SALT_BYTES = 16
+LOGIN_WORKERS = 4
+LOGIN_POLL_MS = 25
+LOGIN_MAX_FAILURES = 5
+LOGIN_BACKOFF_SECONDS = 2
+LOGIN_MAX_BACKOFF_SECONDS = 300
+LOGIN_BUDGET_MS = 1000
+FORECAST_HISTORY_DAYS = 365
+FORECAST_WINDOW_DAYS = 28
+FORECAST_SEASON_WEEKS = 8
+FORECAST_REVIEW_DAYS = 7
+FORECAST_LEAD_DAYS = 2
+FORECAST_SERVICE_Z = 1.65
 
-class DatabaseManager:
+ROLLUP_REBUILD_SQL = [
+    "DELETE FROM rollup_sales",
+    "DELETE FROM rollup_items",
+    """
+    INSERT INTO rollup_sales (day, hour, server_id, orders_opened, orders_completed, revenue)
+    SELECT substr(timestamp, 1, 10), CAST(substr(timestamp, 12, 2) AS INTEGER), COALESCE(server_id, 0), COUNT(*),
+           SUM(status = 'Completed'), SUM(CASE WHEN status = 'Completed' THEN total_amount ELSE 0 END)
+    FROM orders GROUP BY 1, 2, 3
+    """,
+    """
+    INSERT INTO rollup_items (day, hour, server_id, menu_item_id, quantity)
+    SELECT substr(o.timestamp, 1, 10), CAST(substr(o.timestamp, 12, 2) AS INTEGER), COALESCE(o.server_id, 0),
+           od.menu_item_id, SUM(od.quantity)
+    FROM order_details od JOIN orders o ON od.order_id = o.id
+    WHERE od.status IS NOT 'Void'
+    GROUP BY 1, 2, 3, 4
+    """,
+]
+
+def migrate_legacy_reservations(cur):
+    # Reservations used to live only in the table label as "T-3 (Guest)".
+    now = datetime.now().replace(second=0, microsecond=0)
+    for t_id, label, cap in cur.execute("SELECT id, label, capacity FROM restaurant_tables WHERE status='Reserved'").fetchall():
+        base, _, guest = (label or f"T-{t_id}").partition(" (")
+        cur.execute("""
+            INSERT INTO reservations (table_id, guest_name, party_size, start_time, end_time, status, created_at)
+            VALUES (?, ?, ?, ?, ?, 'Held', ?)
+        """, (t_id, guest.rstrip(")") or "Guest", cap, now, now + timedelta(minutes=RESERVATION_MINUTES), now))
+        cur.execute("UPDATE restaurant_tables SET label=? WHERE id=?", (base, t_id))
+
+def assign_kitchen_stations(cur):
+    cur.executemany("UPDATE categories SET station=?, course=?, prep_minutes=? WHERE name=?",
+                    [defaults + (name,) for name, defaults in KITCHEN_DEFAULTS.items()])
+
+# Ordered, forward-only schema migrations: (version, description, steps).
+# A step is either an SQL string or a callable taking the cursor. Never edit
+# a released migration; append a new one instead.
+SCHEMA_MIGRATIONS = [
+    (1, "Secondary indexes for KDS, billing, inventory and floor lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_order_details_order_status ON order_details(order_id, status, menu_item_id)",
+        "CREATE INDEX IF NOT EXISTS idx_order_details_status ON order_details(status, order_id, menu_item_id)",
+        "CREATE INDEX IF NOT EXISTS idx_recipe_links_menu_item ON recipe_links(menu_item_id, inventory_id, amount_needed)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_status_timestamp ON orders(status, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_restaurant_tables_order ON restaurant_tables(current_order_id)",
+        # 'Cooking' rows are a tiny fraction of history; a partial index keeps the
+        # KDS lookup cheap even after ANALYZE marks status as low-selectivity.
+        "CREATE INDEX IF NOT EXISTS idx_order_details_cooking ON order_details(order_id, menu_item_id) WHERE status = 'Cooking'",
+    ]),
+    (2, "Change-version column on restaurant_tables for incremental floor refresh", [
+        "ALTER TABLE restaurant_tables ADD COLUMN version INTEGER DEFAULT 0",
+        "UPDATE restaurant_tables SET version = id",
+        "CREATE INDEX IF NOT EXISTS idx_restaurant_tables_version ON restaurant_tables(version)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_restaurant_tables_insert_version
+        AFTER INSERT ON restaurant_tables
+        BEGIN
+            UPDATE restaurant_tables SET version = (SELECT MAX(version) FROM restaurant_tables) + 1 WHERE id = NEW.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_restaurant_tables_update_version
+        AFTER UPDATE OF label, capacity, status, current_order_id ON restaurant_tables
+        WHEN OLD.label IS NOT NEW.label OR OLD.capacity IS NOT NEW.capacity
+          OR OLD.status IS NOT NEW.status OR OLD.current_order_id IS NOT NEW.current_order_id
+        BEGIN
+            UPDATE restaurant_tables SET version = (SELECT MAX(version) FROM restaurant_tables) + 1 WHERE id = NEW.id;
+        END
+        """,
+    ]),
+    (3, "Event log for cross-terminal change notifications", [
+        """
+        CREATE TABLE IF NOT EXISTS event_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT,
+            payload TEXT,
+            origin TEXT,
+            created_at DATETIME
+        )
+        """,
+    ]),
+    (4, "Menu version counter bumped by any menu, category or recipe change", [
+        "CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value INTEGER)",
+        "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('menu_version', 1)",
+    ] + [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_{action.lower()}_menu_version
+        AFTER {action} ON {table}
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'menu_version';
+        END
+        """
+        for table in ("categories", "menu_items", "recipe_links")
+        for action in ("INSERT", "UPDATE", "DELETE")
+    ]),
+    (5, "Inventory journal for write-behind stock deductions", [
+        """
+        CREATE TABLE IF NOT EXISTS inventory_journal (
+            id INTEGER PRIMARY KEY,
+            inventory_id INTEGER,
+            delta INTEGER,
+            order_detail_id INTEGER,
+            created_at DATETIME,
+            applied INTEGER DEFAULT 0,
+            FOREIGN KEY(inventory_id) REFERENCES inventory(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_inventory_journal_pending ON inventory_journal(inventory_id, delta) WHERE applied = 0",
+    ]),
+    (6, "Incremental sales rollups by day, hour, server and item", [
+        """
+        CREATE TABLE IF NOT EXISTS rollup_sales (
+            day TEXT,
+            hour INTEGER,
+            server_id INTEGER,
+            orders_opened INTEGER DEFAULT 0,
+            orders_completed INTEGER DEFAULT 0,
+            revenue REAL DEFAULT 0.0,
+            PRIMARY KEY (day, hour, server_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rollup_items (
+            day TEXT,
+            hour INTEGER,
+            server_id INTEGER,
+            menu_item_id INTEGER,
+            quantity INTEGER DEFAULT 0,
+            PRIMARY KEY (day, hour, server_id, menu_item_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_rollup_items_item ON rollup_items(menu_item_id, quantity)",
+    ] + ROLLUP_REBUILD_SQL),
+    (7, "Time-ranged reservations per table", [
+        """
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY,
+            table_id INTEGER,
+            guest_name TEXT,
+            party_size INTEGER,
+            start_time DATETIME,
+            end_time DATETIME,
+            status TEXT DEFAULT 'Booked',
+            created_at DATETIME,
+            FOREIGN KEY(table_id) REFERENCES restaurant_tables(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reservations_status_end ON reservations(status, end_time)",
+        "CREATE INDEX IF NOT EXISTS idx_reservations_table_status ON reservations(table_id, status)",
+        migrate_legacy_reservations,
+    ]),
+    (8, "Room and position on restaurant_tables for combining adjacent tables", [
+        "ALTER TABLE restaurant_tables ADD COLUMN room TEXT DEFAULT 'Main'",
+        "ALTER TABLE restaurant_tables ADD COLUMN position INTEGER",
+        "UPDATE restaurant_tables SET room = COALESCE(room, 'Main'), position = id",
+    ]),
+    (9, "Running bill totals on orders and prices captured on order_details", [
+        "ALTER TABLE orders ADD COLUMN subtotal REAL DEFAULT 0.0",
+        "ALTER TABLE orders ADD COLUMN tax REAL DEFAULT 0.0",
+        "ALTER TABLE order_details ADD COLUMN unit_price REAL",
+        "UPDATE order_details SET unit_price = (SELECT price FROM menu_items m WHERE m.id = order_details.menu_item_id)",
+        """
+        UPDATE orders SET subtotal = ROUND(COALESCE((SELECT SUM(od.unit_price * od.quantity) FROM order_details od
+                                                     WHERE od.order_id = orders.id), 0), 2)
+        """,
+        f"UPDATE orders SET tax = ROUND(subtotal * {TAX_RATE}, 2)",
+        "UPDATE orders SET total_amount = subtotal + tax WHERE status != 'Completed'",
+    ]),
+    (10, "Kitchen station, course and prep time per category; per-item bump time", [
+        "ALTER TABLE categories ADD COLUMN station TEXT DEFAULT 'Line'",
+        "ALTER TABLE categories ADD COLUMN course INTEGER DEFAULT 2",
+        "ALTER TABLE categories ADD COLUMN prep_minutes INTEGER DEFAULT 10",
+        assign_kitchen_stations,
+        "ALTER TABLE order_details ADD COLUMN bumped_at DATETIME",
+    ]),
+    (11, "End-of-day close snapshots; indexes for a day's orders and their journal rows", [
+        """
+        CREATE TABLE IF NOT EXISTS day_close (
+            day TEXT PRIMARY KEY,
+            closed_at DATETIME,
+            closed_by INTEGER,
+            orders INTEGER,
+            open_orders INTEGER,
+            items INTEGER,
+            subtotal REAL,
+            tax REAL,
+            total REAL,
+            voids INTEGER,
+            void_amount REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS day_close_lines (
+            day TEXT,
+            section TEXT,
+            ref_id INTEGER,
+            label TEXT,
+            quantity REAL,
+            amount REAL,
+            theoretical REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_day_close_lines_day ON day_close_lines(day, section)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_timestamp ON orders(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_journal_detail ON inventory_journal(order_detail_id, inventory_id, delta)",
+    ]),
+    (12, "Inventory version counter bumped by stock edits made outside the journal", [
+        "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('inventory_version', 1)",
+        "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('inventory_flushing', 0)",
+    ] + [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_{action.split()[0].lower()}_inventory_version
+        AFTER {action} ON inventory
+        WHEN (SELECT value FROM app_meta WHERE key = 'inventory_flushing') = 0
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'inventory_version';
+        END
+        """
+        for action in ("INSERT", "UPDATE OF quantity", "DELETE")
+    ]),
+]
+
+KitchenTicket = namedtuple("KitchenTicket", "order_id table_label timestamp items expected_ready")
+ParSuggestion = namedtuple("ParSuggestion", "inventory_id name on_hand daily_average moving_average seasonal "
+                                             "safety_stock par_level order_quantity")
+
+class OutOfStockError(Exception):
+    pass
+
+class ReservationConflictError(Exception):
+    pass
+
+def to_minutes(when):
+    return int(when.timestamp() // 60)
+
+class EventBus:
+    def __init__(self):
+        self.handlers = {}
+
+    def subscribe(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def unsubscribe(self, event, handler):
+        if handler in self.handlers.get(event, []):
+            self.handlers[event].remove(handler)
+
+    def emit(self, event, **payload):
+        for handler in list(self.handlers.get(event, [])):
+            handler(**payload)
+
+class MenuCatalog:
+    # Process-wide snapshot of the menu, reloaded only when the menu_version
+    # counter in app_meta moves. words is a sorted (word, item id) list over
+    # every word of every item name, so a search term is a bisect to the first
+    # word with that prefix and a short walk.
+    def __init__(self, db):
+        self.db = db
+        self.version = None
+        self.categories = []
+        self.items = {}
+        self.items_by_category = {}
+        self.recipes = {}
+        self.words = []
+        self.lock = threading.Lock()
+
+    def current_version(self):
+        return self.db.get_data("SELECT value FROM app_meta WHERE key='menu_version'")[0][0]
+
+    def refresh(self):
+        # The new maps are built in locals and swapped in together under the
+        # lock, version last, so a reader on another thread sees either the old
+        # menu or the new one and never a dict that is still being filled.
+        version = self.current_version()
+        if version == self.version:
+            return self
+        categories = self.db.get_data("SELECT id, name FROM categories ORDER BY id")
+        items = {}
+        items_by_category = {cat_id: [] for cat_id, _ in categories}
+        for i_id, cat_id, name, price in self.db.get_data("SELECT id, category_id, name, price FROM menu_items ORDER BY id"):
+            items[i_id] = (i_id, cat_id, name, price)
+            items_by_category.setdefault(cat_id, []).append((i_id, name, price))
+        recipes = {}
+        for i_id, inv_id, amount in self.db.get_data("SELECT menu_item_id, inventory_id, amount_needed FROM recipe_links"):
+            recipes.setdefault(i_id, []).append((inv_id, amount))
+        words = sorted({(word, i_id) for i_id, _, name, _ in items.values() for word in re.findall(r"\w+", name.lower())})
+        with self.lock:
+            self.categories, self.items, self.items_by_category = categories, items, items_by_category
+            self.recipes, self.words = recipes, words
+            self.version = version
+        return self
+
+    def search(self, text):
+        # Ids of items where every term starts some word of the name, or None
+        # for an empty query.
+        matches = None
+        for term in re.findall(r"\w+", text.lower()):
+            found = set()
+            i = bisect_left(self.words, (term,))
+            while i < len(self.words) and self.words[i][0].startswith(term):
+                found.add(self.words[i][1])
+                i += 1
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        return matches
+
+class InventoryEngine:
+    # Effective stock (inventory.quantity plus unapplied journal deltas) held in
+    # compact arrays indexed by slot, and the recipe graph in CSR form, so an
+    # availability check is O(ingredients) with no I/O. Deductions are journaled
+    # in the order's own transaction and folded into inventory by flush().
+    # portions[] is the "86 board": how many of each menu item can still be
+    # made, kept current by recomputing only items that use a changed slot.
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.versions = {}
+        self.slots = {}
+        self.inventory_ids = array("q")
+        self.stock = array("q")
+        self.item_index = {}
+        self.recipe_offsets = array("l", [0])
+        self.recipe_slots = array("l")
+        self.recipe_amounts = array("l")
+        self.item_ids = array("q")
+        self.portions = array("q")
+        self.slot_items = []
+        self.changed_items = set()
+        self.pending = 0
+        self.marks = None
+        self.journal_id = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded = False
+
+    def slot_for(self, inv_id):
+        slot = self.slots.get(inv_id)
+        if slot is None:
+            slot = self.slots[inv_id] = len(self.stock)
+            self.inventory_ids.append(inv_id)
+            self.stock.append(0)
+        return slot
+
+    def markers(self, conn):
+        return conn.execute("""
+            SELECT (SELECT value FROM app_meta WHERE key = 'menu_version'),
+                   (SELECT value FROM app_meta WHERE key = 'inventory_version'),
+                   (SELECT COALESCE(MAX(id), 0) FROM inventory_journal)
+        """).fetchone()
+
+    def load(self, conn):
+        # One read transaction so the stock and the journal id it covers come
+        # from the same snapshot.
+        own = not conn.in_transaction
+        if own:
+            conn.execute("BEGIN")
+        try:
+            self.read(conn)
+        finally:
+            if own:
+                conn.commit()
+
+    def read(self, conn):
+        *self.marks, self.journal_id = self.markers(conn)
+        rows = conn.execute("""
+            SELECT i.id, i.quantity + COALESCE((SELECT SUM(j.delta) FROM inventory_journal j
+                                               WHERE j.applied = 0 AND j.inventory_id = i.id), 0)
+            FROM inventory i ORDER BY i.id
+        """).fetchall()
+        self.slots = {}
+        self.inventory_ids = array("q")
+        self.stock = array("q")
+        for inv_id, qty in rows:
+            self.stock[self.slot_for(inv_id)] = qty
+
+        was_available = {item_id: self.portions[i] > 0 for i, item_id in enumerate(self.item_ids)}
+        catalog = self.db.menu.refresh()
+        self.item_index = {}
+        self.item_ids = array("q")
+        self.recipe_offsets = array("l", [0])
+        self.recipe_slots = array("l")
+        self.recipe_amounts = array("l")
+        for item_id, ingredients in catalog.recipes.items():
+            self.item_index[item_id] = len(self.item_ids)
+            self.item_ids.append(item_id)
+            for inv_id, amount in ingredients:
+                self.recipe_slots.append(self.slot_for(inv_id))
+                self.recipe_amounts.append(amount)
+            self.recipe_offsets.append(len(self.recipe_slots))
+
+        self.slot_items = [[] for _ in self.stock]
+        self.portions = array("q", [0] * len(self.item_ids))
+        for index, item_id in enumerate(self.item_ids):
+            for k in range(self.recipe_offsets[index], self.recipe_offsets[index + 1]):
+                self.slot_items[self.recipe_slots[k]].append(index)
+            self.portions[index] = self.compute_portions(index)
+            if (self.portions[index] > 0) != was_available.get(item_id, True):
+                self.changed_items.add(item_id)
+        for item_id, available in was_available.items():
+            if item_id not in self.item_index and not available:
+                self.changed_items.add(item_id)
+
+        self.pending = conn.execute("SELECT COUNT(*) FROM inventory_journal WHERE applied = 0").fetchone()[0]
+        self.loaded = True
+
+    def sync(self, conn):
+        # PRAGMA data_version only moves when another connection commits. Their
+        # journal rows are replayed onto the arrays; only a menu/recipe change
+        # or a stock edit outside the journal forces a full reload.
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self.lock:
+            if self.loaded and self.versions.get(id(conn)) == version:
+                return
+            *marks, journal_id = self.markers(conn)
+            if not self.loaded or marks != self.marks or journal_id < self.journal_id:
+                self.load(conn)
+                self.versions = {}
+            elif journal_id > self.journal_id:
+                slots = set()
+                for inv_id, delta, applied in conn.execute(
+                        "SELECT inventory_id, delta, applied FROM inventory_journal WHERE id > ? AND id <= ?",
+                        (self.journal_id, journal_id)):
+                    slot = self.slot_for(inv_id)
+                    if slot == len(self.slot_items):
+                        self.slot_items.append([])
+                    self.stock[slot] += delta
+                    slots.add(slot)
+                    self.pending += not applied
+                self.update_slots(slots)
+                self.journal_id = journal_id
+            self.versions[id(conn)] = version
+
+    def journaled(self, cur):
+        # Called after this engine's own journal inserts, which reserve() has
+        # already applied, so sync() does not replay them.
+        with self.lock:
+            self.journal_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_journal").fetchone()[0]
+
+    def ingredients(self, menu_item_id):
+        index = self.item_index.get(menu_item_id)
+        if index is None:
+            return range(0)
+        return range(self.recipe_offsets[index], self.recipe_offsets[index + 1])
+
+    def compute_portions(self, index):
+        portions = None
+        for k in range(self.recipe_offsets[index], self.recipe_offsets[index + 1]):
+            amount = self.recipe_amounts[k]
+            if amount > 0:
+                made = max(self.stock[self.recipe_slots[k]], 0) // amount
+                portions = made if portions is None else min(portions, made)
+        return portions if portions is not None else 2 ** 62
+
+    def update_slots(self, slots):
+        for index in {i for slot in slots for i in self.slot_items[slot]}:
+            portions = self.compute_portions(index)
+            if (portions > 0) != (self.portions[index] > 0):
+                self.changed_items.add(self.item_ids[index])
+            self.portions[index] = portions
+
+    def portions_left(self, menu_item_id):
+        index = self.item_index.get(menu_item_id)
+        return None if index is None else self.portions[index]
+
+    def can_make(self, menu_item_id, quantity=1):
+        index = self.item_index.get(menu_item_id)
+        return index is None or self.portions[index] >= quantity
+
+    def drain_changes(self):
+        with self.lock:
+            changed, self.changed_items = self.changed_items, set()
+        return changed
+
+    def reserve(self, menu_item_id, quantity=1):
+        with self.lock:
+            if not self.can_make(menu_item_id, quantity):
+                raise OutOfStockError(f"Not enough ingredients for menu item {menu_item_id}")
+            deltas = []
+            slots = []
+            for k in self.ingredients(menu_item_id):
+                slot = self.recipe_slots[k]
+                amount = self.recipe_amounts[k] * quantity
+                self.stock[slot] -= amount
+                slots.append(slot)
+                deltas.append((self.inventory_ids[slot], -amount))
+            self.update_slots(slots)
+            self.pending += len(deltas)
+            return deltas
+
+    def restock(self, menu_item_id, quantity=1):
+        with self.lock:
+            deltas = []
+            slots = []
+            for k in self.ingredients(menu_item_id):
+                slot = self.recipe_slots[k]
+                amount = self.recipe_amounts[k] * quantity
+                self.stock[slot] += amount
+                slots.append(slot)
+                deltas.append((self.inventory_ids[slot], amount))
+            self.update_slots(slots)
+            self.pending += len(deltas)
+            return deltas
+
+    def quantity(self, inv_id):
+        slot = self.slots.get(inv_id)
+        return self.stock[slot] if slot is not None else 0
+
+    def flush(self, cur):
+        # One transaction folds every unapplied delta into inventory and marks
+        # it applied; a crash either side of the commit leaves the journal and
+        # the inventory table consistent, so nothing is lost or applied twice.
+        # inventory_flushing keeps the fold from bumping inventory_version.
+        cur.execute("UPDATE app_meta SET value = 1 WHERE key = 'inventory_flushing'")
+        cur.execute("""
+            UPDATE inventory SET quantity = quantity + (
+                SELECT SUM(j.delta) FROM inventory_journal j WHERE j.applied = 0 AND j.inventory_id = inventory.id)
+            WHERE id IN (SELECT inventory_id FROM inventory_journal WHERE applied = 0)
+        """)
+        cur.execute("UPDATE inventory_journal SET applied = 1 WHERE applied = 0")
+        cur.execute("UPDATE app_meta SET value = 0 WHERE key = 'inventory_flushing'")
+        with self.lock:
+            self.pending = 0
+
+class TableSchedule:
+    # Non-overlapping bookings on one table as parallel sorted start/end lists
+    # (in minutes), so a free check is a single bisect.
     def __init__(self):
-        self.conn = sqlite3.connect(DB_NAME)
-        self.cur = self.conn.cursor()
-        self.initialize_tables()
-        self.seed_data()
+        self.starts = []
+        self.ends = []
+        self.ids = []
+
+    def is_free(self, start, end):
+        i = bisect_left(self.starts, end)
+        return i == 0 or self.ends[i - 1] <= start
+
+    def add(self, booking_id, start, end):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, booking_id)
+
+    def remove(self, booking_id, start):
+        i = bisect_left(self.starts, start)
+        while self.ids[i] != booking_id:
+            i += 1
+        del self.starts[i], self.ends[i], self.ids[i]
+
+class ReservationBook:
+    # Live bookings (Booked, Held, Seated) indexed by TableSchedule per table.
+    # Tables are walked in capacity order so the first free one is the
+    # tightest fit.
+    ACTIVE = ("Booked", "Held", "Seated")
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.versions = {}
+        self.capacities = []
+        self.schedules = {}
+        self.bookings = {}
+        self.by_start = []
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded = False
+
+    def load(self, conn):
+        self.capacities = sorted((cap or 0, t_id) for t_id, cap in conn.execute("SELECT id, capacity FROM restaurant_tables"))
+        self.schedules = {t_id: TableSchedule() for _, t_id in self.capacities}
+        self.bookings = {}
+        self.by_start = []
+        rows = conn.execute(f"""
+            SELECT id, table_id, guest_name, party_size, start_time, end_time, status FROM reservations
+            WHERE status IN ({",".join("?" * len(self.ACTIVE))}) AND end_time >= ?
+        """, self.ACTIVE + (datetime.now(),)).fetchall()
+        for res_id, t_id, guest, party, start, end, status in rows:
+            self.add(res_id, t_id, datetime.fromisoformat(str(start)), datetime.fromisoformat(str(end)), guest, party, status)
+        self.loaded = True
+
+    def sync(self, conn):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self.lock:
+            if not self.loaded or self.versions.get(id(conn)) != version:
+                self.load(conn)
+                self.versions = {}
+            self.versions[id(conn)] = version
+
+    def add(self, res_id, table_id, start, end, guest, party, status="Booked"):
+        a = to_minutes(start)
+        self.schedules.setdefault(table_id, TableSchedule()).add(res_id, a, to_minutes(end))
+        insort(self.by_start, (a, res_id))
+        self.bookings[res_id] = (table_id, start, end, guest, party, status)
+
+    def remove(self, res_id):
+        booking = self.bookings.pop(res_id, None)
+        if booking is None:
+            return
+        a = to_minutes(booking[1])
+        self.schedules[booking[0]].remove(res_id, a)
+        self.by_start.pop(bisect_left(self.by_start, (a, res_id)))
+
+    def set_status(self, res_id, status):
+        if res_id in self.bookings:
+            self.bookings[res_id] = self.bookings[res_id][:5] + (status,)
+
+    def is_free(self, table_id, start, end):
+        schedule = self.schedules.get(table_id)
+        return schedule is None or schedule.is_free(to_minutes(start), to_minutes(end))
+
+    def free_tables(self, party_size, start, end):
+        k = bisect_left(self.capacities, (party_size, -1))
+        return [t_id for _, t_id in self.capacities[k:] if self.is_free(t_id, start, end)]
+
+    def best_table(self, party_size, start, end):
+        k = bisect_left(self.capacities, (party_size, -1))
+        for _, t_id in self.capacities[k:]:
+            if self.is_free(t_id, start, end):
+                return t_id
+        return None
+
+    def starting_between(self, start, end):
+        i = bisect_left(self.by_start, (to_minutes(start), -1))
+        j = bisect_left(self.by_start, (to_minutes(end) + 1, -1))
+        return [res_id for _, res_id in self.by_start[i:j]]
+
+Party = namedtuple("Party", "party_id size start end")
+
+class TableAssigner:
+    # Best-fit packing of parties onto single tables or runs of adjacent tables
+    # (consecutive positions in one room). Parties are placed largest-first
+    # within a start time on the smallest free candidate, which keeps wasted
+    # seats low; leaving or cancelling frees the slot and retries only the
+    # waiting parties. Times are plain minutes. Occupied tables are unusable
+    # until vacated, however long the party stays.
+    def __init__(self, tables, max_combined=MAX_COMBINED_TABLES):
+        self.capacity = {}
+        rooms = {}
+        for t_id, cap, room, position in tables:
+            self.capacity[t_id] = cap or 0
+            rooms.setdefault(room, []).append((position, t_id))
+        self.schedules = {t_id: TableSchedule() for t_id in self.capacity}
+
+        candidates = []
+        for layout in rooms.values():
+            layout.sort()
+            for i in range(len(layout)):
+                for n in range(1, max_combined + 1):
+                    run = layout[i:i + n]
+                    if len(run) < n or run[-1][0] - run[0][0] != n - 1:
+                        break
+                    ids = tuple(t_id for _, t_id in run)
+                    candidates.append((sum(self.capacity[t] for t in ids), n, ids))
+        candidates.sort()
+        self.candidates = candidates
+        self.candidate_caps = [c[0] for c in candidates]
+        self.table_candidates = {t_id: [] for t_id in self.capacity}
+        for index, (_, _, ids) in enumerate(candidates):
+            for t_id in ids:
+                self.table_candidates[t_id].append(index)
+        self.assignments = {}
+        self.waiting = {}
+        self.occupied = set()
+        self.totals = {"parties_seated": 0, "covers": 0, "wasted_seats": 0, "turned_away": 0}
+
+    def block(self, table_id, start, end, block_id=None):
+        self.schedules[table_id].add(block_id or ("block", table_id), start, end)
+
+    def unblock(self, table_id, block_id, start, end, now):
+        schedule = self.schedules[table_id]
+        if block_id not in schedule.ids:
+            return []
+        schedule.remove(block_id, start)
+        return self.retry_waiting(now, [table_id], end)
+
+    def occupy(self, table_id):
+        self.occupied.add(table_id)
+
+    def vacate(self, table_id, now):
+        if table_id not in self.occupied:
+            return []
+        self.occupied.discard(table_id)
+        return self.retry_waiting(now, [table_id], float("inf"))
+
+    def find(self, size, start, end, indexes=None):
+        if indexes is None:
+            indexes = range(bisect_left(self.candidate_caps, size), len(self.candidates))
+        for index in indexes:
+            cap, _, ids = self.candidates[index]
+            if cap >= size and all(t not in self.occupied and self.schedules[t].is_free(start, end) for t in ids):
+                return ids
+        return None
+
+    def place(self, party, indexes=None):
+        ids = self.find(party.size, party.start, party.end, indexes)
+        if ids is None:
+            self.waiting[party.party_id] = party
+            return None
+        for t_id in ids:
+            self.schedules[t_id].add(party.party_id, party.start, party.end)
+        self.assignments[party.party_id] = (ids, party)
+        self.waiting.pop(party.party_id, None)
+        self.totals["parties_seated"] += 1
+        self.totals["covers"] += party.size
+        self.totals["wasted_seats"] += sum(self.capacity[t] for t in ids) - party.size
+        return ids
+
+    def solve(self, parties):
+        for party in sorted(parties, key=lambda p: (p.start, -p.size)):
+            self.place(party)
+        return self.assignments
+
+    def release(self, party_id, now=None):
+        if self.waiting.pop(party_id, None) is not None:
+            self.totals["turned_away"] += 1
+            return []
+        assigned = self.assignments.pop(party_id, None)
+        if assigned is None:
+            return []
+        ids, party = assigned
+        for t_id in ids:
+            self.schedules[t_id].remove(party_id, party.start)
+        return self.retry_waiting(now if now is not None else party.start, ids, party.end)
+
+    def retry_waiting(self, now, freed, freed_until):
+        # Only candidates that include a freed table can have become usable, and
+        # only for parties that would start before the freed slot ran out.
+        indexes = sorted({i for t_id in freed for i in self.table_candidates[t_id]})
+        largest = max((self.candidates[i][0] for i in indexes), default=0)
+        seated = []
+        for party in sorted(self.waiting.values(), key=lambda p: (p.start, -p.size)):
+            start = max(party.start, now)
+            if party.size > largest or start >= freed_until:
+                continue
+            if self.place(party._replace(start=start, end=start + party.end - party.start), indexes):
+                seated.append(party.party_id)
+        return seated
+
+    def stats(self):
+        return dict(self.totals, waiting=len(self.waiting))
+
+class QueryStats:
+    # Per-statement counters shared by every pooled connection: calls, time in
+    # execute and fetch, rows, and a latency histogram. A statement slower than
+    # slow_ms gets its EXPLAIN QUERY PLAN captured the first time it happens.
+    BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+    EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.statements = {}
+        self.slow = {}
+
+    def key(self, sql):
+        key = self.keys.get(sql)
+        if key is None:
+            key = self.keys[sql] = " ".join(sql.split())
+        return key
+
+    def record(self, sql, seconds, rows):
+        key = self.key(sql)
+        ms = seconds * 1000
+        with self.lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                                                "histogram": [0] * (len(self.BUCKETS_MS) + 1)}
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["rows"] += rows
+            entry["histogram"][bisect_left(self.BUCKETS_MS, ms)] += 1
+        return ms >= self.slow_ms and key not in self.slow
+
+    def add_fetch(self, sql, seconds, rows):
+        with self.lock:
+            entry = self.statements.get(self.key(sql))
+            if entry:
+                entry["total_ms"] += seconds * 1000
+                entry["rows"] += rows
+
+    def explain(self, conn, sql, params, seconds):
+        plan = []
+        if sql.lstrip().upper().startswith(self.EXPLAINABLE):
+            try:
+                plan = [row[-1] for row in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+            except sqlite3.Error as e:
+                plan = [f"(no plan: {e})"]
+        with self.lock:
+            self.slow[self.key(sql)] = {"ms": seconds * 1000, "plan": plan, "seen_at": datetime.now().isoformat(" ")}
+
+    def percentile(self, histogram, pct):
+        target = sum(histogram) * pct / 100
+        seen = 0
+        for bound, n in zip(self.BUCKETS_MS + (float("inf"),), histogram):
+            seen += n
+            if n and seen >= target:
+                return bound
+        return 0.0
+
+    def snapshot(self):
+        with self.lock:
+            rows = [(key, dict(entry, histogram=list(entry["histogram"]))) for key, entry in self.statements.items()]
+            slow = {key: dict(info) for key, info in self.slow.items()}
+        result = []
+        for key, entry in sorted(rows, key=lambda r: -r[1]["total_ms"]):
+            result.append({"sql": key, "count": entry["count"], "total_ms": entry["total_ms"],
+                           "avg_ms": entry["total_ms"] / entry["count"], "p50_ms": self.percentile(entry["histogram"], 50),
+                           "p99_ms": self.percentile(entry["histogram"], 99), "max_ms": entry["max_ms"], "rows": entry["rows"],
+                           "histogram": dict(zip([f"<={b}" for b in self.BUCKETS_MS] + ["more"], entry["histogram"])),
+                           "slow": slow.get(key)})
+        return result
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"generated_at": datetime.now().isoformat(" "), "slow_ms": self.slow_ms,
+                       "statements": self.snapshot()}, f, indent=2)
+
+    def reset(self):
+        with self.lock:
+            self.statements = {}
+            self.slow = {}
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        stats = self.connection.stats
+        start = time.perf_counter()
+        sqlite3.Cursor.execute(self, sql, params)
+        elapsed = time.perf_counter() - start
+        self.sql = sql
+        if stats.record(sql, elapsed, max(self.rowcount, 0)):
+            stats.explain(self.connection, sql, params, elapsed)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        stats = self.connection.stats
+        start = time.perf_counter()
+        sqlite3.Cursor.executemany(self, sql, seq_of_params)
+        self.sql = sql
+        stats.record(sql, time.perf_counter() - start, max(self.rowcount, 0))
+        return self
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = sqlite3.Cursor.fetchall(self)
+        self.connection.stats.add_fetch(self.sql, time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchone(self):
+        row = sqlite3.Cursor.fetchone(self)
+        if row is not None:
+            self.connection.stats.add_fetch(self.sql, 0.0, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = sqlite3.Cursor.fetchmany(self, self.arraysize if size is None else size)
+        self.connection.stats.add_fetch(self.sql, time.perf_counter() - start, len(rows))
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # Iterating a cursor (for row in conn.execute(...)) fetches row by row
+        # without going through fetchone, so rows are counted here too.
+        row = sqlite3.Cursor.__next__(self)
+        self.connection.stats.add_fetch(self.sql, 0.0, 1)
+        return row
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute() in C bypasses an overridden cursor(), so the
+    # shortcuts are routed through TimedCursor here as well.
+    stats = None
+
+    def cursor(self, factory=TimedCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+class KitchenScheduler:
+    # Cooking lines are popped from one heap in due order (order time plus a
+    # gap per course, so a table's mains never jump its starters) and list-
+    # scheduled onto their station's cooks, kept as a heap of when each cook is
+    # next free. That gives every line and ticket an expected ready time, and
+    # tickets come out in the order the kitchen should work them. Cooks start
+    # from the earliest line already due rather than from now, so work begun
+    # before this refresh counts and cooks come free when those lines finish.
+    # A line past its time but not yet bumped shows as ready now.
+    def __init__(self, cooks=STATION_COOKS):
+        self.cooks = cooks
+
+    def schedule(self, rows, now):
+        # Times are epoch seconds; each order's timestamp is parsed once and
+        # each distinct ready minute formatted once.
+        opened = {}
+        queue = []
+        for detail_id, order_id, label, ts, name, station, course, prep in rows:
+            start = opened.get(order_id)
+            if start is None:
+                start = opened[order_id] = datetime.fromisoformat(str(ts)).timestamp()
+            queue.append((start + course * COURSE_GAP_MINUTES * 60, detail_id, order_id, label, str(ts), name, station, course, prep))
+        heapq.heapify(queue)
+
+        now = now.timestamp()
+        free = {}
+        tickets = {}
+        while queue:
+            due, detail_id, order_id, label, ts, name, station, course, prep = heapq.heappop(queue)
+            cooks = free.get(station)
+            if cooks is None:
+                cooks = free[station] = [min(due, now)] * self.cooks.get(station, 1)
+            finish = max(heapq.heappop(cooks), due) + prep * 60
+            heapq.heappush(cooks, finish)
+            ready = max(finish, now)
+            ticket = tickets.setdefault(order_id, [label, ts, [], ready])
+            ticket[2].append((detail_id, name, station, course, ready))
+            ticket[3] = max(ticket[3], ready)
+
+        minutes = {}
+
+        def fmt(seconds):
+            minute = int(seconds // 60)
+            text = minutes.get(minute)
+            if text is None:
+                text = minutes[minute] = datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:%M")
+            return text
+
+        return [KitchenTicket(order_id, label, ts,
+                              tuple((d, n, st, c, fmt(r)) for d, n, st, c, r in sorted(items, key=lambda i: (i[3], i[0]))),
+                              fmt(ready))
+                for order_id, (label, ts, items, ready) in tickets.items()]
+
+    @staticmethod
+    def for_station(tickets, station):
+        result = []
+        for ticket in tickets:
+            items = tuple(i for i in ticket.items if i[2] == station)
+            if items:
+                result.append(ticket._replace(items=items))
+        return result
+
+class OrderArchive:
+    # Completed orders that have left the live database, one SQLite file per
+    # month beside it: archive/<db name>_orders_YYYY-MM.db.
+    def __init__(self, db_name, directory=None):
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(db_name)), ARCHIVE_DIR)
+        self.prefix = os.path.splitext(os.path.basename(db_name))[0] + "_orders_"
+
+    def path(self, month):
+        return os.path.join(self.directory, f"{self.prefix}{month}.db")
+
+    def months(self, start=None, end=None):
+        if not os.path.isdir(self.directory):
+            return []
+        months = sorted(n[len(self.prefix):-3] for n in os.listdir(self.directory)
+                        if n.startswith(self.prefix) and n.endswith(".db"))
+        return [m for m in months if (start is None or m >= str(start)[:7]) and (end is None or m <= str(end)[:7])]
+
+def require_numpy():
+    # NumPy is only needed for forecasting, so it is imported on first use.
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Demand forecasting needs NumPy; install it with 'pip install numpy'") from None
+    return numpy
+
+class DemandForecaster:
+    # Daily ingredient usage as a days x ingredients NumPy matrix. SQLite groups
+    # the order lines by day and menu item (archived months included), the
+    # cursor is drained in BULK_BATCH chunks into a days x items matrix, and
+    # one product with the items x ingredients recipe matrix turns dishes into
+    # ingredients. No per-line rows are ever held in Python.
+    def __init__(self, db):
+        self.np = require_numpy()
+        self.db = db
+
+    def positions(self, ids, values):
+        # Column of each value in the sorted ids array, and which values have one.
+        np = self.np
+        if not len(ids):
+            return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+        cols = np.searchsorted(ids, values).clip(max=len(ids) - 1)
+        return cols, ids[cols] == values
+
+    def usage(self, start, end):
+        np = self.np
+        item_ids = np.array(sorted(r[0] for r in self.db.get_data("SELECT id FROM menu_items")), dtype=np.int64)
+        links = np.array(self.db.get_data("SELECT menu_item_id, inventory_id, COALESCE(amount_needed, 0) FROM recipe_links"),
+                         dtype=np.int64).reshape(-1, 3)
+        inv_ids = np.unique(links[:, 1])
+        recipes = np.zeros((len(item_ids), len(inv_ids)))
+        rows, keep = self.positions(item_ids, links[:, 0])
+        np.add.at(recipes, (rows[keep], np.searchsorted(inv_ids, links[keep, 1])), links[keep, 2])
+
+        sold = np.zeros(((end - start).days, len(item_ids)))
+        bounds = (start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        with self.db.history(*bounds) as conn:
+            cur = conn.execute("""
+                SELECT CAST(julianday(substr(o.timestamp, 1, 10)) - julianday(?) AS INTEGER), od.menu_item_id,
+                       COALESCE(SUM(od.quantity), 0)
+                FROM orders o JOIN order_details od ON od.order_id = o.id
+                WHERE o.timestamp >= ? AND o.timestamp < ? AND od.status IS NOT 'Void'
+                GROUP BY 1, 2
+            """, (bounds[0],) + bounds)
+            while True:
+                chunk = cur.fetchmany(BULK_BATCH)
+                if not chunk:
+                    break
+                chunk = np.array(chunk, dtype=np.int64)
+                cols, keep = self.positions(item_ids, chunk[:, 1])
+                np.add.at(sold, (chunk[keep, 0], cols[keep]), chunk[keep, 2])
+        return inv_ids, sold @ recipes
+
+    def forecast(self, usage, first_day, horizon, window=FORECAST_WINDOW_DAYS, weeks=FORECAST_SEASON_WEEKS):
+        # Moving average over the last `window` days, scaled per day of week by
+        # each weekday's share of the last `weeks` full weeks. Returns the
+        # average, the seasonal forecast for `horizon` days from first_day, and
+        # the spread of the seasonal model's errors over the window.
+        np = self.np
+        recent = usage[-window:]
+        if not len(recent):
+            zeros = np.zeros(usage.shape[1])
+            return zeros, np.zeros((horizon, usage.shape[1])), zeros
+        average = recent.mean(axis=0)
+        span = min(weeks, len(usage) // 7) * 7
+        index = np.ones((7, usage.shape[1]))
+        if span:
+            season = usage[-span:].reshape(span // 7, 7, -1).mean(axis=0)
+            season = np.roll(season, (first_day - timedelta(days=span)).weekday(), axis=0)
+            level = season.mean(axis=0)
+            np.divide(season, level, out=index, where=level > 0)
+        ahead = [(first_day + timedelta(days=h)).weekday() for h in range(horizon)]
+        past = [(first_day - timedelta(days=len(recent) - k)).weekday() for k in range(len(recent))]
+        spread = (recent - average * index[past]).std(axis=0)
+        return average, average * index[ahead], spread
+
+    def suggest(self, days=FORECAST_HISTORY_DAYS, window=FORECAST_WINDOW_DAYS, weeks=FORECAST_SEASON_WEEKS,
+                review_days=FORECAST_REVIEW_DAYS, lead_days=FORECAST_LEAD_DAYS, z=FORECAST_SERVICE_Z, today=None):
+        # Order-up-to levels for a periodic review: the par covers forecast
+        # demand until the next delivery after this one arrives, plus safety
+        # stock for forecast error over that time.
+        np = self.np
+        first_day = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        inv_ids, usage = self.usage(first_day - timedelta(days=days), first_day)
+        cover = review_days + lead_days
+        average, seasonal, spread = self.forecast(usage, first_day, cover, window, weeks)
+        demand = seasonal.sum(axis=0)
+        safety = z * spread * np.sqrt(cover)
+        par = np.ceil(demand + safety)
+        self.db.inventory.sync(self.db.conn)
+        on_hand = np.array([self.db.inventory.quantity(int(i)) for i in inv_ids], dtype=float)
+        order = np.maximum(par - on_hand, 0)
+        names = dict(self.db.get_data("SELECT id, name FROM inventory"))
+        return [ParSuggestion(int(i), names.get(int(i), f"Ingredient #{i}"), int(on_hand[n]), round(float(average[n]), 2),
+                              round(float(average[n] * cover), 1), round(float(demand[n]), 1), round(float(safety[n]), 1),
+                              int(par[n]), int(order[n]))
+                for n, i in enumerate(inv_ids)]
+
+class ConnectionPool:
+    # One read-write and one read-only connection per thread. WAL lets the
+    # readers run alongside the single writer instead of blocking it.
+    def __init__(self, db_name, journal_mode=JOURNAL_MODE, stats=None):
+        self.db_name = db_name
+        self.journal_mode = journal_mode
+        self.stats = stats or QueryStats()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def configure(self, conn, read_only=False):
+        conn.stats = self.stats
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA synchronous=NORMAL" if self.journal_mode == "WAL" else "PRAGMA synchronous=FULL")
+        with self.lock:
+            self.connections.append(conn)
+        return conn
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.configure(sqlite3.connect(self.db_name, check_same_thread=False, factory=TimedConnection))
+            self.local.conn = conn
+            self.local.cur = conn.cursor()
+        return conn
+
+    def cursor(self):
+        self.connection()
+        return self.local.cur
+
+    def reader(self):
+        conn = getattr(self.local, "reader", None)
+        if conn is None:
+            self.connection()
+            uri = "file:" + urllib.request.pathname2url(os.path.abspath(self.db_name)) + "?mode=ro"
+            conn = self.configure(sqlite3.connect(uri, uri=True, check_same_thread=False, factory=TimedConnection), read_only=True)
+            self.local.reader = conn
+        return conn
+
+    def close_all(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
+
+class DatabaseManager:
+    def __init__(self, db_name=DB_NAME, migrate=True, journal_mode=JOURNAL_MODE):
+        self.db_name = db_name
+        self.stats = QueryStats()
+        self.pool = ConnectionPool(db_name, journal_mode, self.stats)
+        self.local = threading.local()
+        self.events = EventBus()
+        self.origin = uuid.uuid4().hex
+        self.menu = MenuCatalog(self)
+        self.inventory = InventoryEngine(self)
+        self.reservations = ReservationBook(self)
+        self.order_archive = OrderArchive(db_name)
+        self.kitchen = KitchenScheduler()
+        self.created = False
+        self.assigner = None
+        self.assigner_lock = threading.Lock()
+        self.events.subscribe("table_status_changed", self.track_table_status)
+        self.events.subscribe("reservation_changed", self.track_reservation)
+        # PRAGMA user_version lives in the file header, so an up-to-date
+        # database opens without re-running DDL or probing any table.
+        if not migrate or self.user_version() != SCHEMA_MIGRATIONS[-1][0]:
+            self.created = True
+            self.initialize_tables()
+            if migrate:
+                self.run_migrations()
+            self.bootstrap_admin()
+
+    @property
+    def conn(self):
+        return self.pool.connection()
+
+    @property
+    def cur(self):
+        return self.pool.cursor()
+
+    @property
+    def pending_events(self):
+        if not hasattr(self.local, "pending_events"):
+            self.local.pending_events = []
+        return self.local.pending_events
+
+    @pending_events.setter
+    def pending_events(self, events):
+        self.local.pending_events = events
 
     def initialize_tables(self):
         self.cur.execute("""
@@ -96,17 +1323,56 @@ class DatabaseManager:
                 FOREIGN KEY(inventory_id) REFERENCES inventory(id)
             )
         """)
+        self.cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at DATETIME
+            )
+        """)
         self.conn.commit()
 
-    def seed_data(self):
-        if not self.cur.execute("SELECT * FROM users").fetchone():
-            pw_hash = hashlib.sha256("admin".encode()).hexdigest()
+    def user_version(self):
+        return self.cur.execute("PRAGMA user_version").fetchone()[0]
+
+    def schema_version(self):
+        return self.cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+    def run_migrations(self):
+        current = self.schema_version()
+        for version, description, steps in SCHEMA_MIGRATIONS:
+            if version <= current:
+                continue
+            try:
+                self.cur.execute("BEGIN")
+                for step in steps:
+                    if callable(step):
+                        step(self.cur)
+                    else:
+                        self.cur.execute(step)
+                self.cur.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                                 (version, description, datetime.now()))
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+            print(f"Applied schema migration {version}: {description}")
+        self.cur.execute(f"PRAGMA user_version={SCHEMA_MIGRATIONS[-1][0]}")
+
+    def bootstrap_admin(self):
+        if not self.cur.execute("SELECT 1 FROM users LIMIT 1").fetchone():
             self.cur.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)", 
-                             ("admin", pw_hash, "Manager"))
-            
+                             ("admin", hash_password("admin"), "Manager"))
+            self.conn.commit()
+
+    def seed_data(self):
+        if not self.cur.execute("SELECT 1 FROM categories LIMIT 1").fetchone():
             cats = ["Appetizers", "Mains", "Desserts", "Beverages", "Alcohol"]
-            for c in cats:
-                self.cur.execute("INSERT INTO categories (name) VALUES (?)", (c,))
+            if "station" in self.table_columns(self.conn, "main", "categories"):
+                self.cur.executemany("INSERT INTO categories (name, station, course, prep_minutes) VALUES (?, ?, ?, ?)",
+                                     [(c,) + KITCHEN_DEFAULTS[c] for c in cats])
+            else:
+                self.cur.executemany("INSERT INTO categories (name) VALUES (?)", [(c,) for c in cats])
             
             for i in range(1, 21):
                 cap = 4 if i <= 10 else 2
@@ -135,55 +1401,1525 @@ class DatabaseManager:
                              (ribeye_id, steak_inv_id, 1))
 
             self.conn.commit()
+            self.assigner = None
             print("Database Seeded Successfully.")
+            return True
+        return False
 
     def check_inventory(self, menu_item_id):
-        ingredients = self.get_data("SELECT inventory_id, amount_needed FROM recipe_links WHERE menu_item_id=?", (menu_item_id,))
-        
-        if not ingredients: return True
+        self.inventory.sync(self.conn)
+        return self.inventory.can_make(menu_item_id)
+
+    def refresh_availability(self):
+        self.inventory.sync(self.conn)
+        self.publish_availability()
+
+    def publish_availability(self):
+        changed = self.inventory.drain_changes()
+        if changed:
+            self.events.emit("availability_changed", menu_item_ids=sorted(changed))
+
+    def flush_inventory(self):
+        if self.inventory.pending:
+            with self.transaction() as cur:
+                self.inventory.flush(cur)
+
+    def log_event(self, event, **payload):
+        self.cur.execute("INSERT INTO event_log (event, payload, origin, created_at) VALUES (?, ?, ?, ?)",
+                         (event, json.dumps(payload), self.origin, datetime.now()))
+        self.pending_events.append((event, payload))
+
+    def commit(self):
+        self.conn.commit()
+        events, self.pending_events = self.pending_events, []
+        for event, payload in events:
+            self.events.emit(event, **payload)
+
+    def prune_event_log(self):
+        self.cur.execute("DELETE FROM event_log WHERE id <= (SELECT MAX(id) FROM event_log) - ?", (EVENT_LOG_KEEP,))
+        self.conn.commit()
+
+    @contextmanager
+    def transaction(self):
+        self.cur.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.cur
+        except BaseException as e:
+            self.conn.rollback()
+            self.pending_events = []
+            if not isinstance(e, (OutOfStockError, ReservationConflictError)):
+                self.inventory.invalidate()
+                self.reservations.invalidate()
+            raise
+        self.commit()
+
+    def place_order_item(self, table_id, server_id, menu_item_id):
+        # The stock check runs against the in-memory ledger while holding the
+        # write lock, and the journal rows commit with the order rows, so two
+        # terminals can never both take the last portion.
+        with self.transaction() as cur:
+            self.inventory.sync(cur.connection)
+            if not self.inventory.can_make(menu_item_id):
+                raise OutOfStockError(f"Not enough ingredients for menu item {menu_item_id}")
+
+            order_id, order_server, order_time = cur.execute("""
+                SELECT t.current_order_id, o.server_id, o.timestamp
+                FROM restaurant_tables t LEFT JOIN orders o ON o.id = t.current_order_id
+                WHERE t.id=?
+            """, (table_id,)).fetchone()
+            if not order_id:
+                order_server, order_time = server_id, datetime.now()
+                cur.execute("INSERT INTO orders (table_id, server_id, timestamp, status) VALUES (?, ?, ?, 'Open')",
+                            (table_id, server_id, order_time))
+                order_id = cur.lastrowid
+                self.add_to_rollups(order_time, order_server, orders_opened=1)
+                cur.execute("UPDATE restaurant_tables SET status='Occupied', current_order_id=? WHERE id=?", (order_id, table_id))
+                self.log_event("order_created", order_id=order_id, table_id=table_id)
+                self.log_event("table_status_changed", table_id=table_id, status="Occupied")
 
-        for inv_id, amount in ingredients:
-            stock = self.get_data("SELECT quantity FROM inventory WHERE id=?", (inv_id,))
-            if not stock or stock[0][0] < amount:
+            price = cur.execute("SELECT price FROM menu_items WHERE id=?", (menu_item_id,)).fetchone()[0]
+            cur.execute("INSERT INTO order_details (order_id, menu_item_id, quantity, unit_price) VALUES (?, ?, 1, ?)",
+                        (order_id, menu_item_id, price))
+            detail_id = cur.lastrowid
+            self.add_to_bill(order_id, price)
+            deltas = self.inventory.reserve(menu_item_id)
+            now = datetime.now()
+            cur.executemany("INSERT INTO inventory_journal (inventory_id, delta, order_detail_id, created_at) VALUES (?, ?, ?, ?)",
+                            [(inv_id, delta, detail_id, now) for inv_id, delta in deltas])
+            self.inventory.journaled(cur)
+            self.add_item_to_rollups(order_time, order_server, menu_item_id, 1)
+            self.log_event("item_added", order_id=order_id, detail_id=detail_id, menu_item_id=menu_item_id)
+        self.publish_availability()
+        if self.inventory.pending >= INVENTORY_FLUSH_BATCH:
+            self.flush_inventory()
+        return order_id, detail_id
+
+    def add_to_bill(self, order_id, amount):
+        # Right-hand sides see the pre-update subtotal, so tax and total are
+        # derived from the new subtotal in the same statement.
+        self.cur.execute("""
+            UPDATE orders SET subtotal = ROUND(subtotal + ?, 2),
+                              tax = ROUND(ROUND(subtotal + ?, 2) * ?, 2),
+                              total_amount = ROUND(subtotal + ?, 2) + ROUND(ROUND(subtotal + ?, 2) * ?, 2)
+            WHERE id=?
+        """, (amount, amount, TAX_RATE, amount, amount, TAX_RATE, order_id))
+
+    def get_bill(self, order_id):
+        res = self.get_data("SELECT subtotal, tax, total_amount FROM orders WHERE id=?", (order_id,))
+        return res[0] if res else (0.0, 0.0, 0.0)
+
+    def get_bill_lines(self, order_id):
+        return self.get_data("""
+            SELECT od.id, m.name, od.unit_price, od.quantity, od.status
+            FROM order_details od JOIN menu_items m ON od.menu_item_id = m.id
+            WHERE od.order_id=? ORDER BY od.id
+        """, (order_id,))
+
+    def void_order_item(self, detail_id):
+        with self.transaction() as cur:
+            self.inventory.sync(cur.connection)
+            order_id, menu_item_id, price, qty, status, order_server, order_time, order_status = cur.execute("""
+                SELECT od.order_id, od.menu_item_id, od.unit_price, od.quantity, od.status, o.server_id, o.timestamp, o.status
+                FROM order_details od JOIN orders o ON od.order_id = o.id WHERE od.id=?
+            """, (detail_id,)).fetchone()
+            if order_status == "Completed":
+                # The bill is paid and its revenue is in the rollups; refunds are not voids.
+                raise ValueError(f"Order {order_id} is already paid; its lines can no longer be voided")
+            if status == "Void":
+                return
+            cur.execute("UPDATE order_details SET status='Void' WHERE id=?", (detail_id,))
+            self.add_to_bill(order_id, -price * qty)
+            self.add_item_to_rollups(order_time, order_server, menu_item_id, -qty)
+            if status != "Served":
+                # Nothing was plated yet, so the ingredients go back on the shelf.
+                now = datetime.now()
+                cur.executemany("INSERT INTO inventory_journal (inventory_id, delta, order_detail_id, created_at) VALUES (?, ?, ?, ?)",
+                                [(inv_id, delta, detail_id, now) for inv_id, delta in self.inventory.restock(menu_item_id, qty)])
+                self.inventory.journaled(cur)
+            self.log_event("item_voided", order_id=order_id, detail_id=detail_id, menu_item_id=menu_item_id)
+        self.publish_availability()
+
+    def reprice_order_item(self, detail_id, unit_price):
+        with self.transaction() as cur:
+            row = cur.execute("""
+                SELECT od.order_id, od.unit_price, od.quantity, od.status, o.status
+                FROM order_details od JOIN orders o ON od.order_id = o.id WHERE od.id=?
+            """, (detail_id,)).fetchone()
+            if row is None:
+                raise LookupError(f"No order line {detail_id}")
+            order_id, old_price, qty, status, order_status = row
+            if order_status == "Completed":
+                raise ValueError(f"Order {order_id} is already paid; its lines can no longer be repriced")
+            if status == "Void":
+                # A void line is already off the bill; re-pricing it must not put it back.
+                raise ValueError(f"Line {detail_id} is void and cannot be repriced")
+            cur.execute("UPDATE order_details SET unit_price=? WHERE id=?", (unit_price, detail_id))
+            self.add_to_bill(order_id, (unit_price - old_price) * qty)
+            self.log_event("item_repriced", order_id=order_id, detail_id=detail_id)
+
+    def bump_order(self, order_id):
+        self.cur.execute("UPDATE order_details SET status='Served', bumped_at=? WHERE order_id=? AND status='Cooking'",
+                         (datetime.now(), order_id))
+        self.log_event("item_bumped", order_id=order_id)
+        self.commit()
+
+    def bump_items(self, detail_ids):
+        # Per-line bumps from a station screen; the rest of the ticket keeps cooking.
+        now = datetime.now()
+        with self.transaction() as cur:
+            bumped = {}
+            for detail_id in detail_ids:
+                row = cur.execute("UPDATE order_details SET status='Served', bumped_at=? WHERE id=? AND status='Cooking' "
+                                  "RETURNING order_id", (now, detail_id)).fetchone()
+                if row:
+                    bumped.setdefault(row[0], []).append(detail_id)
+            for order_id, ids in bumped.items():
+                self.log_event("item_bumped", order_id=order_id, detail_ids=ids)
+        return sum(map(len, bumped.values()))
+
+    def close_order(self, order_id, table_id):
+        # The status guard runs under the write lock, so a retried checkout or
+        # two terminals paying the same table count the revenue once. Returns
+        # False when the order was already paid.
+        with self.transaction() as cur:
+            if not cur.execute("UPDATE orders SET status='Completed' WHERE id=? AND status!='Completed'", (order_id,)).rowcount:
                 return False
+            order_server, order_time, total = cur.execute("SELECT server_id, timestamp, total_amount FROM orders WHERE id=?",
+                                                          (order_id,)).fetchone()
+            # A party seated across combined tables shares one order on each.
+            tables = {table_id} | {t for (t,) in cur.execute("SELECT id FROM restaurant_tables WHERE current_order_id=?", (order_id,))}
+            cur.executemany("UPDATE restaurant_tables SET status='Dirty', current_order_id=NULL WHERE id=?", [(t,) for t in sorted(tables)])
+            self.add_to_rollups(order_time, order_server, orders_completed=1, revenue=total)
+            for t in sorted(tables):
+                self.log_event("table_status_changed", table_id=t, status="Dirty")
         return True
 
-    def deduct_inventory(self, menu_item_id):
-        ingredients = self.get_data("SELECT inventory_id, amount_needed FROM recipe_links WHERE menu_item_id=?", (menu_item_id,))
-        for inv_id, amount in ingredients:
-            self.cur.execute("UPDATE inventory SET quantity = quantity - ? WHERE id=?", (amount, inv_id))
-        self.conn.commit()
+    @staticmethod
+    def rollup_key(timestamp, server_id):
+        ts = str(timestamp)
+        return ts[:10], int(ts[11:13]), server_id or 0
+
+    def add_to_rollups(self, timestamp, server_id, orders_opened=0, orders_completed=0, revenue=0.0):
+        self.cur.execute("""
+            INSERT INTO rollup_sales (day, hour, server_id, orders_opened, orders_completed, revenue)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(day, hour, server_id) DO UPDATE SET
+                orders_opened = orders_opened + excluded.orders_opened,
+                orders_completed = orders_completed + excluded.orders_completed,
+                revenue = revenue + excluded.revenue
+        """, self.rollup_key(timestamp, server_id) + (orders_opened, orders_completed, revenue))
+
+    def add_item_to_rollups(self, timestamp, server_id, menu_item_id, quantity):
+        self.cur.execute("""
+            INSERT INTO rollup_items (day, hour, server_id, menu_item_id, quantity) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(day, hour, server_id, menu_item_id) DO UPDATE SET quantity = quantity + excluded.quantity
+        """, self.rollup_key(timestamp, server_id) + (menu_item_id, quantity))
+
+    def rebuild_rollups(self):
+        with self.history() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in ROLLUP_REBUILD_SQL:
+                    conn.execute(statement)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def get_dashboard_stats(self):
+        total_rev, total_orders = self.get_report_data(
+            "SELECT COALESCE(SUM(revenue), 0.0), COALESCE(SUM(orders_opened), 0) FROM rollup_sales")[0]
+        top_item = self.get_report_data("""
+            SELECT m.name, SUM(r.quantity) AS cnt FROM rollup_items r
+            JOIN menu_items m ON r.menu_item_id = m.id
+            GROUP BY r.menu_item_id ORDER BY cnt DESC LIMIT 1
+        """)
+        return total_rev, total_orders, top_item[0][0] if top_item else "N/A"
+
+    def close_day(self, day, closed_by=None):
+        # One streamed pass over the day's orders and their lines fills every
+        # breakdown at once. Actual usage is what the ledger journaled for
+        # those lines (voids before serving come back as restocks); theoretical
+        # usage is the current recipes times everything made.
+        start = datetime.strptime(day, "%Y-%m-%d")
+        bounds = (day, (start + timedelta(days=1)).strftime("%Y-%m-%d"))
+        # The day is read through history(), so a day already moved to the
+        # monthly archive closes with its orders rather than as empty.
+        with self.history(day, day) as conn:
+            menu = {i: (name, cat) for i, name, cat in conn.execute("SELECT id, name, category_id FROM menu_items").fetchall()}
+            categories = dict(conn.execute("SELECT id, name FROM categories").fetchall())
+            users = dict(conn.execute("SELECT id, username FROM users").fetchall())
+            stock_names = dict(conn.execute("SELECT id, name FROM inventory").fetchall())
+            recipes = {}
+            for menu_item_id, inv_id, amount in conn.execute("SELECT menu_item_id, inventory_id, amount_needed FROM recipe_links"):
+                recipes.setdefault(menu_item_id, []).append((inv_id, amount))
+
+            seen = set()
+            orders = open_orders = items = 0
+            subtotal = tax = open_amount = 0.0
+            by_item, by_category, by_server, by_hour, voids, made = {}, {}, {}, {}, {}, {}
+            for order_id, server_id, hour, status, o_subtotal, o_tax, menu_item_id, price, qty, line_status in conn.execute("""
+                SELECT o.id, o.server_id, CAST(substr(o.timestamp, 12, 2) AS INTEGER), o.status, o.subtotal, o.tax,
+                       od.menu_item_id, COALESCE(od.unit_price, m.price), od.quantity, od.status
+                FROM orders o
+                LEFT JOIN order_details od ON od.order_id = o.id
+                LEFT JOIN menu_items m ON m.id = od.menu_item_id
+                WHERE o.timestamp >= ? AND o.timestamp < ?
+            """, bounds):
+                done = status == "Completed"
+                if order_id not in seen:
+                    seen.add(order_id)
+                    if done:
+                        orders += 1
+                        subtotal += o_subtotal or 0.0
+                        tax += o_tax or 0.0
+                        by_server.setdefault(server_id, [0, 0.0])[0] += 1
+                        by_hour.setdefault(hour, [0, 0.0])[0] += 1
+                    else:
+                        open_orders += 1
+                        open_amount += o_subtotal or 0.0
+                if menu_item_id is None:
+                    continue
+                amount = (price or 0.0) * qty
+                if line_status == "Void":
+                    entry = voids.setdefault(menu_item_id, [0, 0.0])
+                    entry[0] += qty
+                    entry[1] += amount
+                    continue
+                made[menu_item_id] = made.get(menu_item_id, 0) + qty
+                if not done:
+                    continue
+                items += qty
+                for table, key, count in ((by_item, menu_item_id, qty), (by_category, menu.get(menu_item_id, ("", None))[1], qty),
+                                          (by_server, server_id, 0), (by_hour, hour, 0)):
+                    entry = table.setdefault(key, [0, 0.0])
+                    entry[0] += count
+                    entry[1] += amount
+
+            theoretical = {}
+            for menu_item_id, qty in made.items():
+                for inv_id, amount in recipes.get(menu_item_id, ()):
+                    theoretical[inv_id] = theoretical.get(inv_id, 0) + amount * qty
+            # Archiving drops the applied journal rows of the orders it moves,
+            # so actual usage is only known when none of the day was archived.
+            archived = orders + open_orders - conn.execute("SELECT COUNT(*) FROM main.orders WHERE timestamp >= ? AND timestamp < ?",
+                                                           bounds).fetchone()[0]
+            actual = None if archived else dict(conn.execute("""
+                SELECT j.inventory_id, -SUM(j.delta)
+                FROM orders o
+                JOIN order_details od ON od.order_id = o.id
+                JOIN inventory_journal j ON j.order_detail_id = od.id
+                WHERE o.timestamp >= ? AND o.timestamp < ?
+                GROUP BY j.inventory_id
+            """, bounds).fetchall())
+
+        item_name = lambda i: menu[i][0] if i in menu else f"Item #{i}"
+        sections = {
+            "item": [(i, item_name(i), q, round(a, 2), None) for i, (q, a) in sorted(by_item.items(), key=lambda kv: -kv[1][1])],
+            "category": [(c, categories.get(c, "Uncategorized"), q, round(a, 2), None) for c, (q, a) in sorted(by_category.items(), key=lambda kv: -kv[1][1])],
+            "server": [(u, users.get(u, "Unassigned" if u is None else f"User #{u}"), q, round(a, 2), None)
+                       for u, (q, a) in sorted(by_server.items(), key=lambda kv: -kv[1][1])],
+            "hour": [(h, f"{h:02d}:00", q, round(a, 2), None) for h, (q, a) in sorted(by_hour.items())],
+            "void": [(i, item_name(i), q, round(a, 2), None) for i, (q, a) in sorted(voids.items(), key=lambda kv: -kv[1][1])],
+            "inventory": [(inv, stock_names.get(inv, f"Ingredient #{inv}"), None if actual is None else actual.get(inv, 0), None,
+                           theoretical.get(inv, 0)) for inv in sorted(set(actual or ()) | set(theoretical))],
+        }
+        report = {
+            "day": day, "closed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "closed_by": closed_by,
+            "orders": orders, "open_orders": open_orders, "open_amount": round(open_amount, 2), "items": items,
+            "subtotal": round(subtotal, 2), "tax": round(tax, 2), "total": round(subtotal + tax, 2),
+            "voids": sum(q for q, _ in voids.values()), "void_amount": round(sum(a for _, a in voids.values()), 2),
+            "archived_orders": archived, "sections": sections,
+        }
+        with self.transaction() as cur:
+            cur.execute("DELETE FROM day_close_lines WHERE day=?", (day,))
+            cur.execute("""
+                INSERT OR REPLACE INTO day_close (day, closed_at, closed_by, orders, open_orders, items, subtotal, tax, total, voids, void_amount)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, tuple(report[k] for k in ("day", "closed_at", "closed_by", "orders", "open_orders", "items",
+                                           "subtotal", "tax", "total", "voids", "void_amount")))
+            cur.executemany("INSERT INTO day_close_lines (day, section, ref_id, label, quantity, amount, theoretical) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [(day, section) + row for section, rows in sections.items() for row in rows])
+            self.log_event("day_closed", day=day)
+        return report
+
+    def set_table_status(self, table_id, status, label=None):
+        if label is None:
+            self.cur.execute("UPDATE restaurant_tables SET status=? WHERE id=?", (status, table_id))
+        else:
+            self.cur.execute("UPDATE restaurant_tables SET status=?, label=? WHERE id=?", (status, label, table_id))
+        self.log_event("table_status_changed", table_id=table_id, status=status)
+        self.commit()
+
+    def get_kitchen_tickets(self, station=None, now=None):
+        rows = self.get_report_data("""
+            SELECT od.id, o.id, t.label, o.timestamp, m.name,
+                   COALESCE(c.station, 'Line'), COALESCE(c.course, 2), COALESCE(c.prep_minutes, 10)
+            FROM order_details od
+            JOIN orders o ON od.order_id = o.id
+            JOIN restaurant_tables t ON o.table_id = t.id
+            JOIN menu_items m ON od.menu_item_id = m.id
+            LEFT JOIN categories c ON m.category_id = c.id
+            WHERE od.status = 'Cooking'
+        """)
+        tickets = self.kitchen.schedule(rows, now or datetime.now().replace(microsecond=0))
+        return self.kitchen.for_station(tickets, station) if station else tickets
+
+    def get_stations(self):
+        return [s for (s,) in self.get_data("SELECT DISTINCT COALESCE(station, 'Line') FROM categories ORDER BY 1")]
+
+    def get_tables_changed_since(self, version):
+        return self.get_data("""
+            SELECT t.id, t.label, t.capacity, t.status, t.current_order_id, t.version,
+                   (SELECT r.guest_name || ' ' || substr(r.start_time, 12, 5) || ' (' || r.party_size || ')'
+                    FROM reservations r WHERE r.table_id = t.id AND r.status = 'Held' ORDER BY r.start_time LIMIT 1)
+            FROM restaurant_tables t WHERE t.version > ? ORDER BY t.id
+        """, (version,))
+
+    def get_table_layout(self):
+        return self.get_data("SELECT id, capacity, COALESCE(room, 'Main'), COALESCE(position, id) FROM restaurant_tables ORDER BY id")
+
+    def build_assigner(self, now=None):
+        # Tonight's floor as an assigner: bookings from now until closing are
+        # placed on their booked tables, and tables busy right now are occupied.
+        now = now or datetime.now()
+        start = to_minutes(now)
+        assigner = TableAssigner(self.get_table_layout())
+        for t_id, status in self.get_data("SELECT id, status FROM restaurant_tables WHERE status != 'Free'"):
+            if t_id in assigner.schedules:
+                assigner.occupy(t_id)
+        self.reservations.sync(self.conn)
+        for t_id, schedule in self.reservations.schedules.items():
+            for res_id, a, b in zip(schedule.ids, schedule.starts, schedule.ends):
+                if b > start and t_id in assigner.schedules:
+                    assigner.block(t_id, a, b, res_id)
+        return assigner
+
+    def floor_assigner(self, now=None):
+        # Built once, then kept current by table and reservation events (ours
+        # and, through ChangeNotifier, other terminals').
+        if self.assigner is None:
+            self.assigner = self.build_assigner(now)
+        return self.assigner
+
+    def track_table_status(self, table_id, status, **_):
+        with self.assigner_lock:
+            if self.assigner is None or table_id not in self.assigner.schedules:
+                return
+            if status == "Free":
+                self.assigner.vacate(table_id, to_minutes(datetime.now()))
+            else:
+                self.assigner.occupy(table_id)
+
+    def track_reservation(self, reservation_id, table_id, start, end, status, **_):
+        with self.assigner_lock:
+            if self.assigner is None or table_id not in self.assigner.schedules:
+                return
+            if status == "Booked":
+                if reservation_id not in self.assigner.schedules[table_id].ids:
+                    self.assigner.block(table_id, start, end, reservation_id)
+            elif status != "Seated":
+                self.assigner.unblock(table_id, reservation_id, start, end, to_minutes(datetime.now()))
+
+    def suggest_tables(self, party_size, minutes=RESERVATION_MINUTES, now=None):
+        now = now or datetime.now()
+        with self.assigner_lock:
+            return self.floor_assigner(now).find(party_size, to_minutes(now), to_minutes(now) + minutes)
+
+    def seat_party(self, table_ids, server_id=None):
+        # Opens one order for a walk-in and ties every table of a combined run
+        # to it, so the whole run shows Occupied and pays as one bill.
+        table_ids = list(dict.fromkeys(table_ids))
+        if not table_ids:
+            raise ValueError("No tables to seat")
+        with self.transaction() as cur:
+            marks = ",".join("?" * len(table_ids))
+            rows = dict(cur.execute(f"SELECT id, status FROM restaurant_tables WHERE id IN ({marks})", table_ids).fetchall())
+            for t_id in table_ids:
+                if t_id not in rows:
+                    raise LookupError(f"No table {t_id}")
+                if rows[t_id] != "Free":
+                    raise ValueError(f"Table {t_id} is {rows[t_id]}, not Free")
+            order_time = datetime.now()
+            cur.execute("INSERT INTO orders (table_id, server_id, timestamp, status) VALUES (?, ?, ?, 'Open')",
+                        (table_ids[0], server_id, order_time))
+            order_id = cur.lastrowid
+            self.add_to_rollups(order_time, server_id, orders_opened=1)
+            cur.executemany("UPDATE restaurant_tables SET status='Occupied', current_order_id=? WHERE id=?",
+                            [(order_id, t_id) for t_id in table_ids])
+            self.log_event("order_created", order_id=order_id, table_id=table_ids[0])
+            for t_id in table_ids:
+                self.log_event("table_status_changed", table_id=t_id, status="Occupied")
+        return order_id
+
+    def book_table(self, guest_name, party_size, start, minutes=RESERVATION_MINUTES, table_id=None):
+        start = start.replace(second=0, microsecond=0)
+        end = start + timedelta(minutes=minutes)
+        with self.transaction() as cur:
+            self.reservations.sync(cur.connection)
+            if table_id is None:
+                table_id = self.reservations.best_table(party_size, start, end)
+                if table_id is None:
+                    raise ReservationConflictError(f"No table for {party_size} is free at {start:%H:%M}")
+            elif dict((t, cap) for cap, t in self.reservations.capacities).get(table_id, 0) < party_size:
+                raise ReservationConflictError(f"Table {table_id} does not seat {party_size}")
+            elif not self.reservations.is_free(table_id, start, end):
+                raise ReservationConflictError(f"Table {table_id} is already booked around {start:%H:%M}")
+            cur.execute("""
+                INSERT INTO reservations (table_id, guest_name, party_size, start_time, end_time, status, created_at)
+                VALUES (?, ?, ?, ?, ?, 'Booked', ?)
+            """, (table_id, guest_name, party_size, start, end, datetime.now()))
+            res_id = cur.lastrowid
+            self.reservations.add(res_id, table_id, start, end, guest_name, party_size)
+            self.log_event("reservation_changed", reservation_id=res_id, table_id=table_id,
+                           start=to_minutes(start), end=to_minutes(end), status="Booked")
+        self.apply_reservation_holds()
+        return res_id, table_id
+
+    def cancel_reservation(self, reservation_id):
+        with self.transaction() as cur:
+            self.reservations.sync(cur.connection)
+            row = cur.execute("SELECT table_id, status, start_time, end_time FROM reservations WHERE id=?", (reservation_id,)).fetchone()
+            if row is None:
+                raise LookupError(f"No reservation {reservation_id}")
+            table_id, status, start, end = row
+            if status not in ReservationBook.ACTIVE:
+                raise ValueError(f"Reservation {reservation_id} is already {status}")
+            cur.execute("UPDATE reservations SET status='Cancelled' WHERE id=?", (reservation_id,))
+            self.log_event("reservation_changed", reservation_id=reservation_id, table_id=table_id, status="Cancelled",
+                           start=to_minutes(datetime.fromisoformat(str(start))), end=to_minutes(datetime.fromisoformat(str(end))))
+            if status == "Held":
+                cur.execute("UPDATE restaurant_tables SET status='Free' WHERE id=? AND status='Reserved'", (table_id,))
+                self.log_event("table_status_changed", table_id=table_id, status="Free")
+            self.reservations.remove(reservation_id)
+
+    def seat_reservation(self, reservation_id):
+        # Only the host knows who actually sat down, so seating a booking is an
+        # explicit step; ordering on a held table does not claim it.
+        with self.transaction() as cur:
+            self.reservations.sync(cur.connection)
+            row = cur.execute("SELECT table_id, status FROM reservations WHERE id=?", (reservation_id,)).fetchone()
+            if row is None:
+                raise LookupError(f"No reservation {reservation_id}")
+            table_id, status = row
+            if status not in ("Booked", "Held"):
+                raise ValueError(f"Reservation {reservation_id} is already {status}")
+            cur.execute("UPDATE reservations SET status='Seated' WHERE id=?", (reservation_id,))
+            self.reservations.set_status(reservation_id, "Seated")
+            cur.execute("UPDATE restaurant_tables SET status='Occupied' WHERE id=? AND status IN ('Free', 'Reserved')", (table_id,))
+            if cur.rowcount:
+                self.log_event("table_status_changed", table_id=table_id, status="Occupied")
+        return table_id
+
+    def held_reservation(self, table_id):
+        res = self.get_data("SELECT id, guest_name, party_size FROM reservations WHERE table_id=? AND status='Held' "
+                            "ORDER BY start_time LIMIT 1", (table_id,))
+        return res[0] if res else None
+
+    def apply_reservation_holds(self, now=None):
+        # Tables are held (shown as Reserved) once a booking is within the hold
+        # window; only bookings starting in that window are looked at. A hold
+        # nobody claims within the no-show grace period is released.
+        now = now or datetime.now()
+        self.reservations.sync(self.conn)
+        grace = now - timedelta(minutes=RESERVATION_NOSHOW_MINUTES)
+        due = [res_id for res_id in self.reservations.starting_between(grace, now + timedelta(minutes=RESERVATION_HOLD_MINUTES))
+               if self.reservations.bookings[res_id][5] == "Booked"]
+        expired = [res_id for res_id in self.reservations.starting_between(now - timedelta(days=1), grace - timedelta(minutes=1))
+                   if self.reservations.bookings[res_id][5] in ("Booked", "Held")]
+        if not due and not expired:
+            return
+        with self.transaction() as cur:
+            for res_id in expired:
+                table_id, start, end = self.reservations.bookings[res_id][:3]
+                cur.execute("UPDATE reservations SET status='NoShow' WHERE id=? AND status IN ('Booked', 'Held')", (res_id,))
+                self.reservations.remove(res_id)
+                self.log_event("reservation_changed", reservation_id=res_id, table_id=table_id,
+                               start=to_minutes(start), end=to_minutes(end), status="NoShow")
+                if not cur.execute("SELECT 1 FROM reservations WHERE table_id=? AND status='Held'", (table_id,)).fetchone():
+                    cur.execute("UPDATE restaurant_tables SET status='Free' WHERE id=? AND status='Reserved'", (table_id,))
+                    if cur.rowcount:
+                        self.log_event("table_status_changed", table_id=table_id, status="Free")
+            for res_id in due:
+                table_id = self.reservations.bookings[res_id][0]
+                cur.execute("UPDATE reservations SET status='Held' WHERE id=? AND status='Booked'", (res_id,))
+                self.reservations.set_status(res_id, "Held")
+                cur.execute("UPDATE restaurant_tables SET status='Reserved' WHERE id=? AND status='Free'", (table_id,))
+                if cur.rowcount:
+                    self.log_event("table_status_changed", table_id=table_id, status="Reserved")
+
+    def name_map(self, table):
+        return {name: row_id for row_id, name in self.cur.execute(f"SELECT id, name FROM {table}").fetchall()}
+
+    def import_categories(self, records):
+        # station, course and prep_minutes are optional columns; blanks keep
+        # the current (or default) kitchen routing.
+        def optional(r, key, kind):
+            value = r.get(key)
+            return kind(value) if value not in (None, "") else None
+
+        with self.transaction() as cur:
+            existing = self.name_map("categories")
+            new_cats = {}
+            updated = 0
+            for n, batch in enumerate(batched(records, BULK_BATCH)):
+                updates = []
+                for i, r in enumerate(batch, n * BULK_BATCH + 1):
+                    name = r["name"].strip()
+                    try:
+                        kitchen = (optional(r, "station", str), optional(r, "course", int), optional(r, "prep_minutes", int))
+                    except ValueError:
+                        raise ValueError(f"Record {i} ({name}): bad course or prep_minutes")
+                    if not name:
+                        continue
+                    if name in existing:
+                        updates.append(kitchen + (existing[name],))
+                    else:
+                        new_cats[name] = kitchen
+                cur.executemany("""
+                    UPDATE categories SET station=COALESCE(?, station), course=COALESCE(?, course),
+                                          prep_minutes=COALESCE(?, prep_minutes) WHERE id=?
+                """, updates)
+                updated += len(updates)
+            cur.executemany("""
+                INSERT INTO categories (station, course, prep_minutes, name)
+                VALUES (COALESCE(?, 'Line'), COALESCE(?, 2), COALESCE(?, 10), ?)
+            """, [kitchen + (name,) for name, kitchen in new_cats.items()])
+        return {"added": len(new_cats), "updated": updated}
+
+    def import_menu(self, records):
+        # Matches items by name; categories named in the file are created on
+        # the fly so a supplier menu loads in one pass.
+        with self.transaction() as cur:
+            categories = self.name_map("categories")
+            items = self.name_map("menu_items")
+            new_items = {}
+            updated = 0
+            for n, batch in enumerate(batched(records, BULK_BATCH)):
+                new_cats = {r["category"].strip() for r in batch} - categories.keys()
+                if new_cats:
+                    cur.executemany("INSERT INTO categories (name) VALUES (?)", [(name,) for name in sorted(new_cats)])
+                    categories = self.name_map("categories")
+                updates = []
+                for i, r in enumerate(batch, n * BULK_BATCH + 1):
+                    name = r["name"].strip()
+                    try:
+                        row = (categories[r["category"].strip()], float(r["price"]), r.get("description") or None)
+                    except (TypeError, ValueError):
+                        raise ValueError(f"Record {i} ({name}): bad price {r.get('price')!r}")
+                    if name in items:
+                        updates.append(row + (items[name],))
+                        updated += 1
+                    else:
+                        new_items[name] = row
+                cur.executemany("UPDATE menu_items SET category_id=?, price=?, description=? WHERE id=?", updates)
+            cur.executemany("INSERT INTO menu_items (category_id, price, description, name) VALUES (?, ?, ?, ?)",
+                            [row + (name,) for name, row in new_items.items()])
+        return {"added": len(new_items), "updated": updated}
+
+    def import_recipes(self, records):
+        # Every menu item named in the file gets exactly the ingredients listed
+        # for it; items not in the file keep their recipes.
+        with self.transaction() as cur:
+            items = self.name_map("menu_items")
+            ingredients = self.name_map("inventory")
+            links = {}
+            for i, r in enumerate(records, 1):
+                item, ingredient = r["menu_item"].strip(), r["ingredient"].strip()
+                if item not in items:
+                    raise ValueError(f"Record {i}: unknown menu item {item!r}")
+                if ingredient not in ingredients:
+                    raise ValueError(f"Record {i}: unknown ingredient {ingredient!r}")
+                try:
+                    amount = int(r["amount"])
+                except (TypeError, ValueError):
+                    amount = 0
+                if amount < 1:
+                    raise ValueError(f"Record {i} ({item}): bad amount {r.get('amount')!r}")
+                links.setdefault(items[item], {})[ingredients[ingredient]] = amount
+            cur.executemany("DELETE FROM recipe_links WHERE menu_item_id=?", [(item_id,) for item_id in links])
+            cur.executemany("INSERT INTO recipe_links (menu_item_id, inventory_id, amount_needed) VALUES (?, ?, ?)",
+                            [(item_id, inv_id, amount) for item_id, parts in links.items() for inv_id, amount in parts.items()])
+        self.inventory.invalidate()
+        return {"added": sum(map(len, links.values())), "updated": 0, "menu_items": len(links)}
+
+    def import_inventory(self, records):
+        # A stock count: pending journal deltas are folded in first, inside the
+        # same transaction, so the counted quantity replaces the true current
+        # level and sales made after the count still deduct from it.
+        with self.transaction() as cur:
+            self.inventory.flush(cur)
+            stock = {name: (inv_id, qty) for inv_id, name, qty in cur.execute("SELECT id, name, quantity FROM inventory").fetchall()}
+            new_items = {}
+            variances = []
+            updated = 0
+            for n, batch in enumerate(batched(records, BULK_BATCH)):
+                updates = []
+                for i, r in enumerate(batch, n * BULK_BATCH + 1):
+                    name = r["name"].strip()
+                    try:
+                        counted = int(float(r["quantity"]))
+                    except (TypeError, ValueError):
+                        raise ValueError(f"Record {i} ({name}): bad quantity {r.get('quantity')!r}")
+                    if name in stock:
+                        inv_id, expected = stock[name]
+                        updates.append((counted, inv_id))
+                        if counted != expected:
+                            variances.append((name, expected, counted))
+                        updated += 1
+                    else:
+                        new_items[name] = counted
+                cur.executemany("UPDATE inventory SET quantity=? WHERE id=?", updates)
+            cur.executemany("INSERT INTO inventory (name, quantity) VALUES (?, ?)", new_items.items())
+        self.inventory.invalidate()
+        return {"added": len(new_items), "updated": updated, "variances": variances}
+
+    EXPORTS = {
+        "categories": ("SELECT name, station, course, prep_minutes FROM categories ORDER BY id",
+                       ("name", "station", "course", "prep_minutes")),
+        "menu": ("""SELECT m.name, c.name, m.price, m.description FROM menu_items m
+                    LEFT JOIN categories c ON m.category_id = c.id ORDER BY m.id""", ("name", "category", "price", "description")),
+        "inventory": ("""SELECT i.name, i.quantity + COALESCE((SELECT SUM(j.delta) FROM inventory_journal j
+                                                                WHERE j.applied = 0 AND j.inventory_id = i.id), 0)
+                         FROM inventory i ORDER BY i.id""", ("name", "quantity")),
+        "recipes": ("""SELECT m.name, i.name, r.amount_needed FROM recipe_links r
+                       JOIN menu_items m ON r.menu_item_id = m.id JOIN inventory i ON r.inventory_id = i.id
+                       ORDER BY r.menu_item_id, r.inventory_id""", ("menu_item", "ingredient", "amount")),
+    }
+
+    def export_rows(self, kind):
+        query, header = self.EXPORTS[kind]
+        return header, self.pool.reader().execute(query)
+
+    def connect_private(self):
+        uri = "file:" + urllib.request.pathname2url(os.path.abspath(self.db_name))
+        conn = sqlite3.connect(uri, uri=True, factory=TimedConnection)
+        conn.stats = self.stats
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    @staticmethod
+    def table_columns(conn, schema, table):
+        return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()]
+
+    def ensure_archive_schema(self, conn):
+        for table, index_sql in (("orders", "CREATE INDEX IF NOT EXISTS archive.idx_orders_timestamp ON orders(timestamp)"),
+                                 ("order_details", "CREATE INDEX IF NOT EXISTS archive.idx_order_details_order ON order_details(order_id)")):
+            columns = conn.execute(f"PRAGMA main.table_info({table})").fetchall()
+            existing = self.table_columns(conn, "archive", table)
+            if not existing:
+                defs = ", ".join(f"{name} {ctype} PRIMARY KEY" if pk else f"{name} {ctype}" for _, name, ctype, _, _, pk in columns)
+                conn.execute(f"CREATE TABLE archive.{table} ({defs})")
+            else:
+                for _, name, ctype, _, _, _ in columns:
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {ctype}")
+            conn.execute(index_sql)
+
+    def archive_orders(self, before):
+        # Completed orders opened before the cutoff move month by month into
+        # their archive file. A WAL commit across attached files is not atomic,
+        # so the copy is INSERT OR REPLACE: if a crash lands between the archive
+        # and the live commit, running the archive again finishes the move.
+        self.flush_inventory()
+        conn = self.connect_private()
+        moved = []
+        try:
+            months = [m for (m,) in conn.execute("""
+                SELECT DISTINCT substr(timestamp, 1, 7) FROM orders WHERE status='Completed' AND timestamp < ? ORDER BY 1
+            """, (before,)).fetchall()]
+            if months:
+                os.makedirs(self.order_archive.directory, exist_ok=True)
+            for month in months:
+                year, mon = map(int, month.split("-"))
+                month_end = f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01"
+                upper = min(month_end, str(before))
+                conn.execute("ATTACH DATABASE ? AS archive", (self.order_archive.path(month),))
+                try:
+                    self.ensure_archive_schema(conn)
+                    conn.commit()
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute("""
+                        CREATE TEMP TABLE moving AS SELECT id FROM main.orders
+                        WHERE status='Completed' AND timestamp >= ? AND timestamp < ?
+                    """, (f"{month}-01", upper))
+                    for table, key in (("orders", "id"), ("order_details", "order_id")):
+                        cols = ", ".join(self.table_columns(conn, "main", table))
+                        conn.execute(f"INSERT OR REPLACE INTO archive.{table} ({cols}) SELECT {cols} FROM main.{table} "
+                                     f"WHERE {key} IN (SELECT id FROM temp.moving)")
+                    conn.execute("""
+                        DELETE FROM main.inventory_journal WHERE applied = 1 AND order_detail_id IN
+                            (SELECT id FROM main.order_details WHERE order_id IN (SELECT id FROM temp.moving))
+                    """)
+                    # Freed journal ids can be handed out again, so engines reload.
+                    conn.execute("UPDATE main.app_meta SET value = value + 1 WHERE key = 'inventory_version'")
+                    details = conn.execute("DELETE FROM main.order_details WHERE order_id IN (SELECT id FROM temp.moving)").rowcount
+                    orders = conn.execute("DELETE FROM main.orders WHERE id IN (SELECT id FROM temp.moving)").rowcount
+                    conn.execute("DROP TABLE temp.moving")
+                    conn.commit()
+                    moved.append((month, orders, details))
+                except BaseException:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+        finally:
+            conn.close()
+        return moved
+
+    @contextmanager
+    def history(self, start=None, end=None):
+        # A private connection on which temp views named orders and
+        # order_details shadow the live tables and union in every archived
+        # month overlapping [start, end], so unqualified SQL spans live and
+        # archived partitions unchanged. Past the ATTACH limit the months are
+        # copied into temp tables instead.
+        conn = self.connect_private()
+        try:
+            months = self.order_archive.months(start, end)
+            if months:
+                tables = {t: self.table_columns(conn, "main", t) for t in ("orders", "order_details")}
+                limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+                chunks = [months[i:i + limit] for i in range(0, len(months), limit)]
+                materialize = len(chunks) > 1
+                if materialize:
+                    for table, cols in tables.items():
+                        conn.execute(f"CREATE TEMP TABLE {table} AS SELECT {', '.join(cols)} FROM main.{table}")
+                for chunk in chunks:
+                    selects = {table: [] for table in tables}
+                    for n, month in enumerate(chunk):
+                        uri = "file:" + urllib.request.pathname2url(self.order_archive.path(month)) + "?mode=ro"
+                        conn.execute(f"ATTACH DATABASE ? AS m{n}", (uri,))
+                        for table, cols in tables.items():
+                            have = set(self.table_columns(conn, f"m{n}", table))
+                            fields = ", ".join(c if c in have else f"NULL AS {c}" for c in cols)
+                            selects[table].append(f"SELECT {fields} FROM m{n}.{table}")
+                    for table, cols in tables.items():
+                        if materialize:
+                            conn.execute(f"INSERT INTO temp.{table} " + " UNION ALL ".join(selects[table]))
+                        else:
+                            conn.execute(f"CREATE TEMP VIEW {table} AS SELECT {', '.join(cols)} FROM main.{table} UNION ALL "
+                                         + " UNION ALL ".join(selects[table]))
+                    if materialize:
+                        conn.commit()
+                        for n in range(len(chunk)):
+                            conn.execute(f"DETACH DATABASE m{n}")
+            yield conn
+        finally:
+            conn.close()
+
+    def get_history_data(self, query, params=(), start=None, end=None):
+        with self.history(start, end) as conn:
+            return conn.execute(query, params).fetchall()
 
     def run_query(self, query, params=()):
-        self.cur.execute(query, params)
+        cur = self.cur
+        cur.execute(query, params)
         self.conn.commit()
-        return self.cur
+        return cur
 
     def get_data(self, query, params=()):
-        self.cur.execute(query, params)
-        return self.cur.fetchall()
+        cur = self.cur
+        cur.execute(query, params)
+        return cur.fetchall()
+
+    def get_report_data(self, query, params=()):
+        return self.pool.reader().execute(query, params).fetchall()
 
     def close(self):
+        self.flush_inventory()
+        self.prune_event_log()
+        self.pool.close_all()
+
+class ChangeNotifier:
+    # Watches PRAGMA data_version on a private connection; it only changes when
+    # another connection commits, so idle polling never touches table pages.
+    def __init__(self, widget, db):
+        self.widget = widget
+        self.db = db
+        self.conn = sqlite3.connect(db.db_name)
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.last_event_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM event_log").fetchone()[0]
+        self.job = None
+
+    def start(self):
+        self.job = self.widget.after(CHANGE_POLL_MS, self.poll)
+
+    def stop(self):
+        if self.job:
+            self.widget.after_cancel(self.job)
+            self.job = None
         self.conn.close()
 
+    def poll(self):
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self.data_version:
+            self.data_version = version
+            self.dispatch_remote_events()
+        self.job = self.widget.after(CHANGE_POLL_MS, self.poll)
+
+    def dispatch_remote_events(self):
+        rows = self.conn.execute("SELECT id, event, payload, origin FROM event_log WHERE id > ? ORDER BY id",
+                                 (self.last_event_id,)).fetchall()
+        for event_id, event, payload, origin in rows:
+            self.last_event_id = event_id
+            if origin != self.db.origin:
+                self.db.events.emit(event, **json.loads(payload))
+        self.db.refresh_availability()
+
+def render_receipt(order_id, items, subtotal, tax, total, when):
+    lines = [
+        "====================================",
+        "        THE GILDED FORK",
+        "====================================",
+        f"Order ID: {order_id}",
+        f"Date: {when.strftime('%Y-%m-%d %H:%M:%S')}",
+        "------------------------------------",
+        f"{'Item':<20} {'Qty':<5} {'Price'}",
+        "------------------------------------",
+    ]
+    for name, price, qty in items:
+        lines.append(f"{name:<20} {qty:<5} ${price:.2f}")
+    lines += [
+        "------------------------------------",
+        f"Subtotal:             ${subtotal:.2f}",
+        f"Tax ({TAX_RATE:.0%}):             ${tax:.2f}",
+        f"TOTAL:                ${total:.2f}",
+        "====================================",
+        "      Thank you for dining!",
+    ]
+    return "\n".join(lines) + "\n"
+
+def render_z_report(report):
+    width = 52
+    rule = "-" * width
+    lines = [
+        "=" * width,
+        f"{'THE GILDED FORK - Z REPORT':^{width}}",
+        "=" * width,
+        f"Business day: {report['day']}",
+        f"Closed: {report['closed_at']}",
+        rule,
+        f"{'Orders completed:':<30}{report['orders']:>22}",
+        f"{'Items sold:':<30}{report['items']:>22}",
+        f"{'Net sales:':<30}{report['subtotal']:>22,.2f}",
+        f"{f'Tax collected ({TAX_RATE:.0%}):':<30}{report['tax']:>22,.2f}",
+        f"{'Gross total:':<30}{report['total']:>22,.2f}",
+        f"{'Voided items:':<30}{report['voids']:>22}",
+        f"{'Voided amount:':<30}{report['void_amount']:>22,.2f}",
+    ]
+    if report["open_orders"]:
+        lines.append(f"{'STILL OPEN:':<30}{report['open_orders']:>10} orders {report['open_amount']:>11,.2f}")
+    titles = {"category": "SALES BY CATEGORY", "item": "SALES BY ITEM", "server": "SALES BY SERVER (orders)",
+              "hour": "SALES BY HOUR (orders)", "void": "VOIDS"}
+    for section, title in titles.items():
+        lines += [rule, title, rule]
+        lines += [f"{label[:30]:<30}{qty:>8}{amount:>14,.2f}" for _, label, qty, amount, _ in report["sections"][section]]
+    lines += [rule, "INVENTORY USED", f"{'Ingredient':<24}{'Actual':>9}{'Recipe':>9}{'Variance':>10}", rule]
+    for _, label, used, _, expected in report["sections"]["inventory"]:
+        if used is None:
+            lines.append(f"{label[:24]:<24}{'-':>9}{expected:>9}{'-':>10}")
+            continue
+        flag = " *" if used != expected else ""
+        lines.append(f"{label[:24]:<24}{used:>9}{expected:>9}{used - expected:>+10}{flag}")
+    lines.append("=" * width)
+    if report.get("archived_orders"):
+        lines.append(f"{report['archived_orders']} orders were read from the archive; actual usage is not kept for them")
+    if any(used is not None and used != expected for _, _, used, _, expected in report["sections"]["inventory"]):
+        lines.append("* actual usage differs from the recipes")
+    return "\n".join(lines) + "\n"
+
+def write_z_report(report, directory=REPORT_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"zreport_{report['day']}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_z_report(report))
+    return path
+
+class ReceiptArchive:
+    # One append-only archive per day plus an index of "order_id offset length"
+    # lines, so a receipt can be found without scanning the archive itself.
+    # The archives live in receipts/ beside the database, created with the
+    # first receipt.
+    def __init__(self, db_name=DB_NAME, directory=None):
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(db_name)), RECEIPT_DIR)
+
+    def paths(self, day):
+        base = os.path.join(self.directory, f"receipts_{day}")
+        return base + ".log", base + ".idx"
+
+    def append(self, order_id, text, when):
+        log_path, idx_path = self.paths(when.strftime("%Y-%m-%d"))
+        data = text.encode("utf-8")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(log_path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(idx_path, "a", encoding="utf-8") as f:
+            f.write(f"{order_id} {offset} {len(data)}\n")
+
+    def days(self):
+        if not os.path.isdir(self.directory):
+            return []
+        names = [n for n in os.listdir(self.directory) if n.startswith("receipts_") and n.endswith(".idx")]
+        return sorted((n[len("receipts_"):-len(".idx")] for n in names), reverse=True)
+
+    def lookup(self, order_id, day=None):
+        for d in [day] if day else self.days():
+            log_path, idx_path = self.paths(d)
+            if not os.path.exists(idx_path):
+                continue
+            with open(idx_path, encoding="utf-8") as f:
+                entry = next((line.split() for line in f if line.split()[0] == str(order_id)), None)
+            if entry:
+                with open(log_path, "rb") as f:
+                    f.seek(int(entry[1]))
+                    return f.read(int(entry[2])).decode("utf-8")
+        return None
+
+class ReceiptWriter:
+    # Renders and archives receipts on a worker thread so checkout never waits
+    # on disk I/O.
+    def __init__(self, archive):
+        self.archive = archive
+        self.queue = queue.Queue()
+        self.errors = []
+        self.thread = threading.Thread(target=self.run, name="receipt-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, order_id, items, subtotal, tax, total):
+        # Returns the archive file the receipt is going to.
+        when = datetime.now()
+        self.queue.put((order_id, list(items), subtotal, tax, total, when))
+        return self.archive.paths(when.strftime("%Y-%m-%d"))[0]
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            order_id, items, subtotal, tax, total, when = job
+            try:
+                self.archive.append(order_id, render_receipt(order_id, items, subtotal, tax, total, when), when)
+            except OSError as e:
+                self.errors.append((order_id, e))
+                print(f"Could not archive receipt for order {order_id}: {e}")
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+class RestaurantService:
+    # Order, table, kitchen and inventory operations with no Tk in sight. The
+    # Tk app calls it in-process; ServiceServer exposes the same methods over
+    # HTTP/JSON and ServiceClient mirrors them for remote terminals. Results are
+    # plain tuples and lists so they survive a JSON round trip unchanged.
+    def __init__(self, db, receipts=None):
+        self.db = db
+        self.receipts = receipts
+
+    def tables(self, since=0):
+        return self.db.get_tables_changed_since(since)
+
+    def table_order(self, table_id):
+        res = self.db.get_data("SELECT current_order_id FROM restaurant_tables WHERE id=?", (table_id,))
+        if not res:
+            raise LookupError(f"No table {table_id}")
+        return res[0][0]
+
+    def add_item(self, table_id, menu_item_id, server_id=None):
+        if not self.db.get_data("SELECT 1 FROM menu_items WHERE id=?", (menu_item_id,)):
+            raise LookupError(f"No menu item {menu_item_id}")
+        self.table_order(table_id)
+        return self.db.place_order_item(table_id, server_id, menu_item_id)
+
+    def seat_party(self, table_ids, server_id=None):
+        return self.db.seat_party([int(t) for t in table_ids], server_id)
+
+    def void_item(self, detail_id):
+        if not self.db.get_data("SELECT 1 FROM order_details WHERE id=?", (detail_id,)):
+            raise LookupError(f"No order line {detail_id}")
+        self.db.void_order_item(detail_id)
+
+    def reprice_item(self, detail_id, unit_price):
+        unit_price = float(unit_price)
+        if unit_price < 0:
+            raise ValueError(f"Price must not be negative, got {unit_price}")
+        self.db.reprice_order_item(detail_id, round(unit_price, 2))
+
+    def bill(self, order_id):
+        return self.db.get_bill(order_id)
+
+    def bill_lines(self, order_id):
+        return self.db.get_bill_lines(order_id)
+
+    def send_to_kitchen(self, order_id):
+        self.db.run_query("UPDATE order_details SET status='Cooking' WHERE order_id=? AND status IS NULL", (order_id,))
+
+    def checkout(self, order_id, table_id):
+        res = self.db.get_data("SELECT status FROM orders WHERE id=? AND (table_id=? OR id IN "
+                               "(SELECT current_order_id FROM restaurant_tables WHERE id=?))", (order_id, table_id, table_id))
+        if not res:
+            raise LookupError(f"No order {order_id} on table {table_id}")
+        if res[0][0] == "Completed":
+            raise ValueError(f"Order {order_id} is already paid")
+        subtotal, tax, total = self.db.get_bill(order_id)
+        if not self.db.close_order(order_id, table_id):
+            raise ValueError(f"Order {order_id} is already paid")
+        receipt = None
+        if self.receipts:
+            items = [(name, price, qty) for _, name, price, qty, status in self.db.get_bill_lines(order_id) if status != "Void"]
+            receipt = self.receipts.submit(order_id, items, subtotal, tax, total)
+        return subtotal, tax, total, receipt
+
+    def set_table_status(self, table_id, status):
+        if status not in TABLE_STATUS_COLORS:
+            raise ValueError(f"Unknown table status {status!r}")
+        self.table_order(table_id)
+        self.db.set_table_status(table_id, status)
+
+    def kitchen_tickets(self, station=None):
+        return self.db.get_kitchen_tickets(station)
+
+    def bump_order(self, order_id):
+        self.db.bump_order(order_id)
+
+    def bump_items(self, detail_ids):
+        return self.db.bump_items([int(d) for d in detail_ids])
+
+    def inventory(self):
+        self.db.inventory.sync(self.db.conn)
+        return [(inv_id, name, self.db.inventory.quantity(inv_id))
+                for inv_id, name in self.db.get_data("SELECT id, name FROM inventory ORDER BY id")]
+
+    def menu(self):
+        catalog = self.db.menu.refresh()
+        self.db.inventory.sync(self.db.conn)
+        return [(i_id, cat_id, name, price, self.db.inventory.portions_left(i_id))
+                for i_id, cat_id, name, price in catalog.items.values()]
+
+    def flush_inventory(self):
+        self.db.flush_inventory()
+
+    def apply_reservation_holds(self):
+        self.db.apply_reservation_holds()
+
+    def suggest_tables(self, party_size, minutes=RESERVATION_MINUTES):
+        return self.db.suggest_tables(party_size, minutes)
+
+    def free_table(self, party_size, start, minutes=RESERVATION_MINUTES):
+        start = datetime.fromisoformat(str(start))
+        self.db.reservations.sync(self.db.conn)
+        return self.db.reservations.best_table(party_size, start, start + timedelta(minutes=minutes))
+
+    def book_table(self, guest_name, party_size, start, minutes=RESERVATION_MINUTES, table_id=None):
+        return self.db.book_table(guest_name, party_size, datetime.fromisoformat(str(start)), minutes, table_id)
+
+    def held_reservation(self, table_id):
+        return self.db.held_reservation(table_id)
+
+    def cancel_reservation(self, reservation_id):
+        self.db.cancel_reservation(reservation_id)
+
+    def seat_reservation(self, reservation_id):
+        return self.db.seat_reservation(reservation_id)
+
+    def close_day(self, day, closed_by=None):
+        return self.db.close_day(day, closed_by)
+
+    def dashboard_stats(self):
+        return self.db.get_dashboard_stats()
+
+    def stations(self):
+        return self.db.get_stations()
+
+    def metrics(self):
+        return self.db.stats.snapshot()
+
+class ServiceServer:
+    # A small HTTP/1.1 server on asyncio: the event loop only parses requests
+    # and writes responses, and every DatabaseManager call runs on a worker
+    # thread with its own pooled connection. Writes (POST) share one writer
+    # thread: SQLite takes one writer at a time anyway, and a single writing
+    # connection keeps the in-memory inventory ledger from reloading after
+    # every sibling thread's commit. Reads fan out over the other workers.
+    ROUTES = [
+        ("GET", r"/tables", "tables"),
+        ("GET", r"/tables/(\d+)/order", "table_order"),
+        ("POST", r"/tables/(\d+)/items", "add_item"),
+        ("POST", r"/tables/(\d+)/status", "set_table_status"),
+        ("POST", r"/parties", "seat_party"),
+        ("GET", r"/orders/(\d+)/bill", "bill"),
+        ("GET", r"/orders/(\d+)/lines", "bill_lines"),
+        ("POST", r"/orders/(\d+)/send", "send_to_kitchen"),
+        ("POST", r"/orders/(\d+)/checkout", "checkout"),
+        ("POST", r"/lines/(\d+)/void", "void_item"),
+        ("POST", r"/lines/(\d+)/price", "reprice_item"),
+        ("GET", r"/kitchen/tickets", "kitchen_tickets"),
+        ("POST", r"/kitchen/orders/(\d+)/bump", "bump_order"),
+        ("POST", r"/kitchen/items/bump", "bump_items"),
+        ("GET", r"/inventory", "inventory"),
+        ("GET", r"/menu", "menu"),
+        ("GET", r"/floor/suggest", "suggest_tables"),
+        ("GET", r"/reservations/free", "free_table"),
+        ("POST", r"/reservations", "book_table"),
+        ("GET", r"/tables/(\d+)/reservation", "held_reservation"),
+        ("POST", r"/reservations/(\d+)/cancel", "cancel_reservation"),
+        ("POST", r"/reservations/(\d+)/seat", "seat_reservation"),
+        ("POST", r"/days/close", "close_day"),
+        ("GET", r"/dashboard", "dashboard_stats"),
+        ("GET", r"/stations", "stations"),
+        ("GET", r"/metrics", "metrics"),
+    ]
+
+    def __init__(self, service, host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.routes = [(method, re.compile(pattern + "$"), name) for method, pattern, name in self.ROUTES]
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="service-writer")
+        self.server = None
+        self.clients = set()
+
+    def route(self, method, path):
+        allowed = False
+        for m, pattern, name in self.routes:
+            match = pattern.match(path)
+            if match:
+                if m == method:
+                    return getattr(self.service, name), [int(g) for g in match.groups()]
+                allowed = True
+        if allowed:
+            return None, None
+        raise LookupError(f"No route for {path}")
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        try:
+            func, args = self.route(method, url.path)
+            if func is None:
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method_not_allowed", "message": f"{method} {url.path} is not allowed"}
+            kwargs = {k: int(v[-1]) if v[-1].isdigit() else v[-1] for k, v in parse_qs(url.query).items()}
+            if body:
+                kwargs.update(json.loads(body))
+            loop = asyncio.get_running_loop()
+            executor = self.writer if method == "POST" else self.executor
+            result = await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+            return HTTPStatus.OK, {"result": result}
+        except OutOfStockError as e:
+            return HTTPStatus.CONFLICT, {"error": "out_of_stock", "message": str(e)}
+        except ReservationConflictError as e:
+            return HTTPStatus.CONFLICT, {"error": "reservation_conflict", "message": str(e)}
+        except LookupError as e:
+            return HTTPStatus.NOT_FOUND, {"error": "not_found", "message": str(e)}
+        except (ValueError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": "bad_request", "message": str(e)}
+        except sqlite3.Error as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "database", "message": str(e)}
+        except Exception as e:
+            print(f"Unhandled error in {method} {url.path}: {e!r}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal", "message": f"{type(e).__name__}: {e}"}
+
+    async def handle(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self.dispatch(method, target, body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def run_periodically(self, interval_ms, func):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval_ms / 1000)
+            try:
+                await loop.run_in_executor(self.writer, func)
+            except sqlite3.Error as e:
+                print(f"{func.__name__} failed: {e}")
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        tasks = [asyncio.ensure_future(self.run_periodically(INVENTORY_FLUSH_MS, self.service.flush_inventory)),
+                 asyncio.ensure_future(self.run_periodically(RESERVATION_CHECK_MS, self.service.apply_reservation_holds))]
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.executor.shutdown()
+            self.writer.shutdown()
+
+    async def shutdown(self):
+        self.server.close()
+        for writer in list(self.clients):
+            writer.close()
+        await self.server.wait_closed()
+        await asyncio.sleep(0)
+
+class ServiceError(Exception):
+    def __init__(self, status, error, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.error = error
+
+class ServiceClient:
+    # Same calls as RestaurantService, made over HTTP with one keep-alive
+    # connection per thread. Out-of-stock and booking conflicts come back as
+    # OutOfStockError and ReservationConflictError so the Tk code handles local
+    # and remote services alike. Only GETs are retried on a dropped connection:
+    # a POST may already have been applied, and replaying it could double an
+    # order line or a checkout.
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or SERVICE_PORT
+        self.local = threading.local()
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        attempts = 2 if method == "GET" else 1
+        for attempt in range(attempts):
+            conn = getattr(self.local, "conn", None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=BUSY_TIMEOUT_MS / 1000 * 2)
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                data = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self.local.conn = None
+                if attempt == attempts - 1:
+                    raise
+        if data.get("error") == "out_of_stock":
+            raise OutOfStockError(data["message"])
+        if data.get("error") == "reservation_conflict":
+            raise ReservationConflictError(data["message"])
+        if response.status != HTTPStatus.OK:
+            raise ServiceError(response.status, data["error"], data["message"])
+        return data["result"]
+
+    def tables(self, since=0):
+        return [tuple(row) for row in self.request("GET", f"/tables?since={since}")]
+
+    def table_order(self, table_id):
+        return self.request("GET", f"/tables/{table_id}/order")
+
+    def add_item(self, table_id, menu_item_id, server_id=None):
+        return tuple(self.request("POST", f"/tables/{table_id}/items", {"menu_item_id": menu_item_id, "server_id": server_id}))
+
+    def seat_party(self, table_ids, server_id=None):
+        return self.request("POST", "/parties", {"table_ids": list(table_ids), "server_id": server_id})
+
+    def void_item(self, detail_id):
+        self.request("POST", f"/lines/{detail_id}/void", {})
+
+    def reprice_item(self, detail_id, unit_price):
+        self.request("POST", f"/lines/{detail_id}/price", {"unit_price": unit_price})
+
+    def bill(self, order_id):
+        return tuple(self.request("GET", f"/orders/{order_id}/bill"))
+
+    def bill_lines(self, order_id):
+        return [tuple(row) for row in self.request("GET", f"/orders/{order_id}/lines")]
+
+    def send_to_kitchen(self, order_id):
+        self.request("POST", f"/orders/{order_id}/send", {})
+
+    def checkout(self, order_id, table_id):
+        return tuple(self.request("POST", f"/orders/{order_id}/checkout", {"table_id": table_id}))
+
+    def set_table_status(self, table_id, status):
+        self.request("POST", f"/tables/{table_id}/status", {"status": status})
+
+    def kitchen_tickets(self, station=None):
+        path = "/kitchen/tickets" + (f"?station={station}" if station else "")
+        return [KitchenTicket(o_id, label, ts, tuple(tuple(item) for item in items), ready)
+                for o_id, label, ts, items, ready in self.request("GET", path)]
+
+    def bump_order(self, order_id):
+        self.request("POST", f"/kitchen/orders/{order_id}/bump", {})
+
+    def bump_items(self, detail_ids):
+        return self.request("POST", "/kitchen/items/bump", {"detail_ids": list(detail_ids)})
+
+    def inventory(self):
+        return [tuple(row) for row in self.request("GET", "/inventory")]
+
+    def menu(self):
+        return [tuple(row) for row in self.request("GET", "/menu")]
+
+    def suggest_tables(self, party_size, minutes=RESERVATION_MINUTES):
+        ids = self.request("GET", "/floor/suggest?" + urlencode({"party_size": party_size, "minutes": minutes}))
+        return tuple(ids) if ids else None
+
+    def free_table(self, party_size, start, minutes=RESERVATION_MINUTES):
+        return self.request("GET", "/reservations/free?" + urlencode({"party_size": party_size, "start": start.isoformat(),
+                                                                      "minutes": minutes}))
+
+    def book_table(self, guest_name, party_size, start, minutes=RESERVATION_MINUTES, table_id=None):
+        return tuple(self.request("POST", "/reservations", {"guest_name": guest_name, "party_size": party_size,
+                                                            "start": start.isoformat(), "minutes": minutes, "table_id": table_id}))
+
+    def held_reservation(self, table_id):
+        held = self.request("GET", f"/tables/{table_id}/reservation")
+        return tuple(held) if held else None
+
+    def cancel_reservation(self, reservation_id):
+        self.request("POST", f"/reservations/{reservation_id}/cancel", {})
+
+    def seat_reservation(self, reservation_id):
+        return self.request("POST", f"/reservations/{reservation_id}/seat", {})
+
+    def close_day(self, day, closed_by=None):
+        return self.request("POST", "/days/close", {"day": day, "closed_by": closed_by})
+
+    def dashboard_stats(self):
+        return tuple(self.request("GET", "/dashboard"))
+
+    def stations(self):
+        return self.request("GET", "/stations")
+
+    def metrics(self):
+        return self.request("GET", "/metrics")
+
+def hash_password(password, iterations=PASSWORD_ITERATIONS, salt=None):
+    salt = salt or secrets.token_bytes(PASSWORD_SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+def verify_password(password, stored, iterations=PASSWORD_ITERATIONS):
+    # Returns (matches, needs_rehash). Hashes from before salting are bare
+    # SHA-256 hex digests and always need rehashing, as do hashes made with a
+    # different iteration count. Checking one still pays for a PBKDF2 run, so
+    # response time does not give away which accounts were never migrated.
+    if "$" not in stored:
+        hashlib.pbkdf2_hmac("sha256", password.encode(), bytes(PASSWORD_SALT_BYTES), iterations)
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored), True
+    _, rounds, salt, digest = stored.split("$")
+    check = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(rounds))
+    return hmac.compare_digest(check.hex(), digest), int(rounds) != iterations
+
+Session = namedtuple("Session", "terminal user_id username role started")
+
 class SessionManager:
-    current_user = None
-    current_role = None
+    # Logged-in users keyed by terminal, so one process can serve many
+    # terminals. The password KDF is slow on purpose and runs on a small
+    # thread pool (pbkdf2_hmac releases the GIL), keeping the Tk loop free.
+    # Unknown users are checked against a dummy hash so they take as long as
+    # known ones. Repeated failures slow down the terminal they come from with
+    # a doubling wait, rather than locking the username, so nobody can lock an
+    # account out from another terminal. Roles are cached by user id.
+    def __init__(self, db, iterations=PASSWORD_ITERATIONS, workers=LOGIN_WORKERS):
+        self.db = db
+        self.iterations = iterations
+        self.dummy_hash = f"pbkdf2_sha256${iterations}${'00' * PASSWORD_SALT_BYTES}${'00' * 32}"
+        self.sessions = {}
+        self.roles = {}
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="login")
+
+    def submit(self, terminal, username, password):
+        return self.executor.submit(self.login, terminal, username, password)
+
+    def login(self, terminal, username, password):
+        self.check_backoff(terminal)
+        row = self.db.get_data("SELECT id, password_hash, role FROM users WHERE username=?", (username,))
+        user_id, stored, role = row[0] if row else (None, self.dummy_hash, None)
+        matches, stale = verify_password(password, stored or self.dummy_hash, self.iterations)
+        if not row or not matches:
+            self.record_failure(terminal)
+            return None
+        if stale:
+            self.db.run_query("UPDATE users SET password_hash=? WHERE id=? AND password_hash=?",
+                              (hash_password(password, self.iterations), user_id, stored))
+        session = Session(terminal, user_id, username, role, datetime.now())
+        with self.lock:
+            self.failures.pop(terminal, None)
+            self.roles[user_id] = role
+            self.sessions[terminal] = session
+        return session
 
     @staticmethod
-    def login(db, username, password):
-        pw_hash = hashlib.sha256(password.encode()).hexdigest()
-        user = db.get_data("SELECT id, role FROM users WHERE username=? AND password_hash=?", (username, pw_hash))
-        if user:
-            SessionManager.current_user = user[0][0]
-            SessionManager.current_role = user[0][1]
-            return True
-        return False
+    def backoff(count):
+        if count < LOGIN_MAX_FAILURES:
+            return 0
+        return min(LOGIN_BACKOFF_SECONDS * 2 ** (count - LOGIN_MAX_FAILURES), LOGIN_MAX_BACKOFF_SECONDS)
+
+    def check_backoff(self, terminal):
+        with self.lock:
+            count, last = self.failures.get(terminal, (0, 0))
+        wait = last + self.backoff(count) - time.monotonic()
+        if wait > 0:
+            raise PermissionError(f"Too many failed logins from this terminal; try again in {wait:.0f}s")
+
+    def record_failure(self, terminal):
+        now = time.monotonic()
+        with self.lock:
+            count, last = self.failures.get(terminal, (0, now))
+            if now - last > LOGIN_MAX_BACKOFF_SECONDS:
+                count = 0
+            self.failures[terminal] = (count + 1, now)
+
+    def logout(self, terminal):
+        with self.lock:
+            self.sessions.pop(terminal, None)
+
+    def current(self, terminal):
+        return self.sessions.get(terminal)
+
+    def user_id(self, terminal):
+        session = self.sessions.get(terminal)
+        return session.user_id if session else None
 
-    @staticmethod
-    def logout():
-        SessionManager.current_user = None
-        SessionManager.current_role = None
+    def role(self, user_id):
+        role = self.roles.get(user_id)
+        if role is None:
+            row = self.db.get_data("SELECT role FROM users WHERE id=?", (user_id,))
+            role = self.roles[user_id] = row[0][0] if row else None
+        return role
+
+    def set_role(self, user_id, role):
+        self.db.run_query("UPDATE users SET role=? WHERE id=?", (role, user_id))
+        with self.lock:
+            self.roles.pop(user_id, None)
+
+    def close(self):
+        self.executor.shutdown()
 
 class LoginScreen(tk.Frame):
     def __init__(self, parent, controller):
@@ -202,18 +2938,40 @@ class LoginScreen(tk.Frame):
         self.entry_pass = ttk.Entry(container, show="*", width=30)
         self.entry_pass.pack(pady=(0,20))
         
-        btn = tk.Button(container, text="LOGIN", bg=ACCENT_COLOR, fg="white", 
-                        font=("Arial", 12, "bold"), command=self.attempt_login, relief="flat", padx=20, pady=5)
-        btn.pack()
+        self.btn_login = tk.Button(container, text="LOGIN", bg=ACCENT_COLOR, fg="white", 
+                                   font=("Arial", 12, "bold"), command=self.attempt_login, relief="flat", padx=20, pady=5)
+        self.btn_login.pack()
+        self.entry_pass.bind("<Return>", lambda e: self.attempt_login())
+        self.pending = None
 
     def attempt_login(self):
+        # The password check runs on the session manager's pool; poll for it
+        # rather than freezing the window for the length of the KDF.
+        if self.pending:
+            return
         u = self.entry_user.get()
         p = self.entry_pass.get()
-        if SessionManager.login(self.controller.db, u, p):
+        self.btn_login.config(state="disabled", text="CHECKING...")
+        self.pending = self.controller.sessions.submit(self.controller.terminal, u, p)
+        self.after(LOGIN_POLL_MS, self.finish_login)
+
+    def finish_login(self):
+        if not self.pending.done():
+            self.after(LOGIN_POLL_MS, self.finish_login)
+            return
+        pending, self.pending = self.pending, None
+        self.btn_login.config(state="normal", text="LOGIN")
+        try:
+            session = pending.result()
+        except PermissionError as e:
+            messagebox.showerror("Please Wait", str(e))
+            return
+        if session:
             self.entry_user.delete(0, 'end')
             self.entry_pass.delete(0, 'end')
             self.controller.show_frame("MainDashboard")
         else:
+            self.entry_pass.delete(0, 'end')
             messagebox.showerror("Error", "Invalid Credentials")
 
 class MainDashboard(tk.Frame):
@@ -236,18 +2994,29 @@ class MainDashboard(tk.Frame):
         self.btn_floor = self.create_nav_btn(sidebar, "Floor Plan", lambda: self.show_view("Floor"))
         self.btn_kitchen = self.create_nav_btn(sidebar, "Kitchen (KDS)", lambda: self.show_view("KDS"))
         self.btn_admin = self.create_nav_btn(sidebar, "Admin/Stats", lambda: self.show_view("Admin"))
+        self.btn_diagnostics = self.create_nav_btn(sidebar, "Diagnostics", lambda: self.show_view("Diagnostics"))
         
         self.content_area = tk.Frame(self, bg=BG_COLOR)
         self.content_area.pack(side="right", fill="both", expand=True)
         
-        self.views = {
-            "Floor": FloorPlanView(self.content_area, controller),
-            "KDS": KitchenView(self.content_area, controller),
-            "Admin": AdminView(self.content_area, controller)
+        # Views are built on first navigation, so nothing here queries the
+        # database before the login screen is up.
+        self.view_classes = {
+            "Floor": FloorPlanView,
+            "KDS": KitchenView,
+            "Admin": AdminView,
+            "Diagnostics": DiagnosticsView
         }
-        
+        self.views = {}
         self.current_view = None
-        self.show_view("Floor")
+
+    def on_show(self):
+        sessions = self.controller.sessions
+        manager = sessions.role(sessions.user_id(self.controller.terminal)) == "Manager"
+        for btn in (self.btn_admin, self.btn_diagnostics):
+            btn.config(state="normal" if manager else "disabled")
+        if self.current_view is None or (not manager and self.current_view in (self.views.get("Admin"), self.views.get("Diagnostics"))):
+            self.show_view("Floor")
 
     def create_nav_btn(self, parent, text, command):
         btn = tk.Button(parent, text=text, command=command, bg="#34495e", fg="white", 
@@ -260,14 +3029,75 @@ class MainDashboard(tk.Frame):
     def show_view(self, view_name):
         if self.current_view:
             self.current_view.pack_forget()
+        if view_name not in self.views:
+            self.views[view_name] = self.view_classes[view_name](self.content_area, self.controller)
         self.current_view = self.views[view_name]
         self.current_view.refresh()
         self.current_view.pack(fill="both", expand=True)
 
     def logout(self):
-        SessionManager.logout()
+        self.controller.sessions.logout(self.controller.terminal)
         self.controller.show_frame("LoginScreen")
 
+TABLE_STATUS_COLORS = {"Free": "#27ae60", "Occupied": "#e74c3c", "Reserved": "#f39c12", "Dirty": "#7f8c8d"}
+
+def parse_reservation_time(text):
+    text = text.strip()
+    if len(text) <= 5:
+        hour, minute = map(int, text.split(":"))
+        return datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return datetime.fromisoformat(text)
+
+class TableCard(tk.Frame):
+    def __init__(self, parent, view, row):
+        tk.Frame.__init__(self, parent, bg="white", bd=1, relief="solid", padx=10, pady=10, width=150, height=150)
+        self.grid_propagate(False)
+        self.view = view
+        self.table_id = row[0]
+        self.row = None
+
+        self.lbl_name = tk.Label(self, font=("Arial", 16, "bold"), bg="white")
+        self.lbl_name.pack()
+        self.lbl_info = tk.Label(self, bg="white", fg="#7f8c8d")
+        self.lbl_info.pack()
+        self.lbl_guest = tk.Label(self, bg="white", fg="#f39c12")
+        self.lbl_guest.pack()
+        self.color_bar = tk.Frame(self, height=5, width=130)
+        self.color_bar.pack(pady=5)
+
+        btn_frame = tk.Frame(self, bg="white")
+        btn_frame.pack(side="bottom", fill="x")
+        self.btn_action = tk.Button(btn_frame, bg=THEME_COLOR, fg="white", width=6,
+                                    command=lambda: view.open_table_manager(self.table_id, self.row[3]))
+        self.btn_action.pack(side="left", padx=2)
+        self.btn_extra = tk.Button(btn_frame, fg="white", width=6)
+
+        self.update_row(row)
+
+    def update_row(self, row):
+        t_id, label, cap, status, order_id, version, guest = row
+        old = self.row or (None,) * 7
+        self.row = row
+        if label != old[1]:
+            self.lbl_name.config(text=label)
+        if guest != old[6]:
+            self.lbl_guest.config(text=guest or "")
+        if cap != old[2] or status != old[3]:
+            self.lbl_info.config(text=f"Cap: {cap} | {status}")
+        if status == old[3]:
+            return
+
+        self.color_bar.config(bg=TABLE_STATUS_COLORS.get(status, "#27ae60"))
+        self.btn_action.config(text="Open" if status == "Free" else "Manage")
+        if status == "Free":
+            self.btn_extra.config(text="Rsrv", bg="#f39c12", command=lambda: self.view.make_reservation(t_id))
+            self.btn_extra.pack(side="right", padx=2)
+        elif status == "Reserved":
+            self.btn_extra.config(text="Cancel", bg="#c0392b", command=lambda: self.view.cancel_reservation(t_id))
+            self.btn_extra.pack(side="right", padx=2)
+        else:
+            self.btn_extra.pack_forget()
+
 class FloorPlanView(tk.Frame):
     def __init__(self, parent, controller):
         tk.Frame.__init__(self, parent, bg=BG_COLOR)
@@ -276,6 +3106,7 @@ class FloorPlanView(tk.Frame):
         header = tk.Frame(self, bg="white", height=50)
         header.pack(fill="x", pady=(0, 20))
         tk.Label(header, text="RESTAURANT FLOOR", font=FONT_HEADER, bg="white").pack(side="left", padx=20, pady=10)
+        tk.Button(header, text="Seat Walk-in", bg=THEME_COLOR, fg="white", command=self.seat_walk_in).pack(side="right", padx=20)
         
         self.canvas = tk.Canvas(self, bg=BG_COLOR)
         self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
@@ -291,110 +3122,248 @@ class FloorPlanView(tk.Frame):
         self.canvas.pack(side="left", fill="both", expand=True, padx=20)
         self.scrollbar.pack(side="right", fill="y")
 
+        self.cards = {}
+        self.table_version = 0
+        self.refresh_pending = False
+        controller.db.events.subscribe("table_status_changed", self.schedule_refresh)
+
+    def schedule_refresh(self, **event):
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.after_idle(self.refresh)
+
     def refresh(self):
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-            
-        tables = self.controller.db.get_data("SELECT * FROM restaurant_tables")
-        
-        row = 0
-        col = 0
-        max_cols = 5
-        
-        for t in tables:
-            t_id, label, cap, status, order_id = t
-            color = "#27ae60"
-            if status == "Occupied": color = "#e74c3c"
-            if status == "Reserved": color = "#f39c12"
-            if status == "Dirty": color = "#7f8c8d"
-            
-            card = tk.Frame(self.scrollable_frame, bg="white", bd=1, relief="solid", padx=10, pady=10, width=150, height=150)
-            card.grid_propagate(False)
-            card.grid(row=row, column=col, padx=10, pady=10)
-            
-            tk.Label(card, text=label, font=("Arial", 16, "bold"), bg="white").pack()
-            tk.Label(card, text=f"Cap: {cap} | {status}", bg="white", fg="#7f8c8d").pack()
-            
-            tk.Frame(card, bg=color, height=5, width=130).pack(pady=5)
-            
-            btn_frame = tk.Frame(card, bg="white")
-            btn_frame.pack(side="bottom", fill="x")
+        self.refresh_pending = False
+        rows = self.controller.service.tables(self.table_version)
+        added = False
+        for row in rows:
+            t_id = row[0]
+            if t_id in self.cards:
+                self.cards[t_id].update_row(row)
+            else:
+                self.cards[t_id] = TableCard(self.scrollable_frame, self, row)
+                added = True
+            self.table_version = max(self.table_version, row[5])
 
-            action_text = "Open" if status == "Free" else "Manage"
-            cmd = lambda tid=t_id, stat=status: self.open_table_manager(tid, stat)
-            tk.Button(btn_frame, text=action_text, command=cmd, bg=THEME_COLOR, fg="white", width=6).pack(side="left", padx=2)
-            
-            if status == "Free":
-                tk.Button(btn_frame, text="Rsrv", bg="#f39c12", fg="white", width=6,
-                          command=lambda tid=t_id: self.make_reservation(tid)).pack(side="right", padx=2)
-            elif status == "Reserved":
-                tk.Button(btn_frame, text="Cancel", bg="#c0392b", fg="white", width=6,
-                          command=lambda tid=t_id: self.cancel_reservation(tid)).pack(side="right", padx=2)
-            
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
+        if added:
+            max_cols = 5
+            for index, t_id in enumerate(sorted(self.cards)):
+                row, col = divmod(index, max_cols)
+                self.cards[t_id].grid(row=row, column=col, padx=10, pady=10)
 
     def make_reservation(self, table_id):
         name = simpledialog.askstring("Reservation", "Enter Guest Name:")
-        if name:
-            self.controller.db.run_query("UPDATE restaurant_tables SET status='Reserved', label=label || ' (' || ? || ')' WHERE id=?", (name, table_id))
-            self.refresh()
+        if not name:
+            return
+        party = simpledialog.askinteger("Reservation", "Party Size:", initialvalue=2, minvalue=1)
+        when = simpledialog.askstring("Reservation", "Time (HH:MM or YYYY-MM-DD HH:MM):",
+                                      initialvalue=datetime.now().strftime("%H:%M"))
+        if not party or not when:
+            return
+        try:
+            start = parse_reservation_time(when)
+        except ValueError:
+            messagebox.showerror("Reservation", f"Could not read time '{when}'")
+            return
+
+        service = self.controller.service
+        try:
+            _, booked = service.book_table(name, party, start, table_id=table_id)
+        except ReservationConflictError as e:
+            alternative = service.free_table(party, start)
+            hint = f"\nTable {alternative} is free then." if alternative else ""
+            messagebox.showwarning("Reservation", f"{e}{hint}")
+            return
+        messagebox.showinfo("Reservation", f"Table {booked} booked for {name}, party of {party}, "
+                                           f"at {start.strftime('%Y-%m-%d %H:%M')}.")
+
+    def seat_walk_in(self):
+        party = simpledialog.askinteger("Walk-in", "Party Size:", initialvalue=2, minvalue=1)
+        if not party:
+            return
+        tables = self.controller.service.suggest_tables(party)
+        if not tables:
+            messagebox.showinfo("Walk-in", f"No free table or adjacent tables seat {party} right now.")
+            return
+        labels = " + ".join(self.cards[t].row[1] if t in self.cards else f"T-{t}" for t in tables)
+        if messagebox.askyesno("Walk-in", f"Seat party of {party} at {labels}?"):
+            try:
+                self.controller.service.seat_party(tables, self.controller.sessions.user_id(self.controller.terminal))
+            except (ValueError, ServiceError) as e:
+                messagebox.showwarning("Walk-in", str(e))
+                return
+            self.open_table_manager(tables[0], "Occupied")
 
     def cancel_reservation(self, table_id):
         if messagebox.askyesno("Cancel", "Cancel this reservation?"):
-            original_label = f"T-{table_id}" 
-            self.controller.db.run_query("UPDATE restaurant_tables SET status='Free', label=? WHERE id=?", (original_label, table_id))
-            self.refresh()
+            held = self.controller.service.held_reservation(table_id)
+            if held:
+                self.controller.service.cancel_reservation(held[0])
+            else:
+                self.controller.service.set_table_status(table_id, "Free")
 
     def open_table_manager(self, table_id, status):
-        TableManagerWindow(self.controller, table_id, status, self.refresh)
+        held = self.controller.service.held_reservation(table_id) if status == "Reserved" else None
+        if held and messagebox.askyesno("Reservation", f"Seat {held[1]}, party of {held[2]}?"):
+            self.controller.service.seat_reservation(held[0])
+            status = "Occupied"
+        self.controller.open_table_window(table_id, status, self.refresh)
 
-class TableManagerWindow(tk.Toplevel):
-    def generate_receipt(self, order_id, subtotal, tax, total):
-        items = self.controller.db.get_data("""
-            SELECT m.name, m.price, od.quantity 
-            FROM order_details od
-            JOIN menu_items m ON od.menu_item_id = m.id
-            WHERE od.order_id=?
-        """, (order_id,))
+class MenuGrid(tk.Frame):
+    # A scrolling grid that only ever holds enough buttons to fill the view.
+    # Scrolling re-labels that pool for the rows now on screen, so a menu of
+    # hundreds of items costs what a dozen did.
+    COLUMNS = 4
+    CELL_WIDTH = 140
+    CELL_HEIGHT = 70
+    WHEEL_EVENTS = ("<MouseWheel>", "<Button-4>", "<Button-5>")
+
+    def __init__(self, parent, db, on_select):
+        tk.Frame.__init__(self, parent, bg="white")
+        self.db = db
+        self.on_select = on_select
+        self.items = []
+        self.pool = []
+        self.slots = []  # item index shown by each pooled button, None when hidden
+        self.shown = {}
+        self.canvas = tk.Canvas(self, bg="white", highlightthickness=0, yscrollincrement=self.CELL_HEIGHT)
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda e: self.render())
+        for sequence in self.WHEEL_EVENTS:
+            self.canvas.bind(sequence, self.on_wheel)
 
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"receipt_{order_id}_{timestamp}.txt"
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.render()
+
+    def on_wheel(self, event):
+        self.yview("scroll", -1 if event.num == 4 or event.delta > 0 else 1, "units")
+
+    def show(self, items):
+        self.items = items
+        rows = -(-len(items) // self.COLUMNS)
+        self.canvas.configure(scrollregion=(0, 0, self.COLUMNS * self.CELL_WIDTH, rows * self.CELL_HEIGHT))
+        self.canvas.yview_moveto(0)
+        self.slots = [-1] * len(self.pool)
+        self.render()
+
+    def render(self):
+        first = int(self.canvas.canvasy(0) // self.CELL_HEIGHT) * self.COLUMNS
+        visible = (self.canvas.winfo_height() // self.CELL_HEIGHT + 2) * self.COLUMNS
+        while len(self.pool) < visible:
+            k = len(self.pool)
+            btn = tk.Button(self.canvas, font=("Arial", 10), width=15, height=3, command=lambda k=k: self.select(k))
+            for sequence in self.WHEEL_EVENTS:
+                btn.bind(sequence, self.on_wheel)
+            self.pool.append((btn, self.canvas.create_window(0, 0, window=btn, anchor="nw", state="hidden")))
+            self.slots.append(None)
+        self.shown = {}
+        for k, (btn, window) in enumerate(self.pool):
+            n = first + k
+            if k >= visible or n >= len(self.items):
+                if self.slots[k] is not None:
+                    self.canvas.itemconfigure(window, state="hidden")
+                    self.slots[k] = None
+                continue
+            i_id, name, price = self.items[n]
+            self.shown[i_id] = btn
+            if self.slots[k] == n:
+                continue
+            btn.config(text=f"{name}\n${price:.2f}", state="normal" if self.db.inventory.can_make(i_id) else "disabled")
+            row, col = divmod(n, self.COLUMNS)
+            self.canvas.coords(window, col * self.CELL_WIDTH + 5, row * self.CELL_HEIGHT + 5)
+            self.canvas.itemconfigure(window, state="normal")
+            self.slots[k] = n
+
+    def select(self, k):
+        if self.slots[k] is not None:
+            self.on_select(self.items[self.slots[k]][0])
+
+    def update_availability(self, menu_item_ids):
+        for i_id in menu_item_ids:
+            btn = self.shown.get(i_id)
+            if btn is not None:
+                btn.config(state="normal" if self.db.inventory.can_make(i_id) else "disabled")
+
+class MenuPanel(tk.Frame):
+    # Category strip and search box over one MenuGrid. Built once per window;
+    # the strip is rebuilt only when the catalog version changes, and typing
+    # filters through the catalog's prefix index.
+    def __init__(self, parent, db, on_select):
+        tk.Frame.__init__(self, parent, bg="white")
+        self.db = db
+        self.on_select = on_select
+        self.version = None
+        self.catalog = None
         
-        try:
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write("====================================\n")
-                f.write(f"        THE GILDED FORK\n")
-                f.write("====================================\n")
-                f.write(f"Order ID: {order_id}\n")
-                f.write(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("------------------------------------\n")
-                f.write(f"{'Item':<20} {'Qty':<5} {'Price'}\n")
-                f.write("------------------------------------\n")
-                
-                for name, price, qty in items:
-                    f.write(f"{name:<20} {qty:<5} ${price:.2f}\n")
-                    
-                f.write("------------------------------------\n")
-                f.write(f"Subtotal:             ${subtotal:.2f}\n")
-                f.write(f"Tax (8%):             ${tax:.2f}\n")
-                f.write(f"TOTAL:                ${total:.2f}\n")
-                f.write("====================================\n")
-                f.write(f"      Thank you for dining!\n")
-            
-            messagebox.showinfo("Receipt", f"Receipt saved as {filename}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not save receipt: {e}")
+        search_bar = tk.Frame(self, bg="white")
+        search_bar.pack(fill="x", padx=5, pady=5)
+        tk.Label(search_bar, text="Search", bg="white").pack(side="left")
+        self.query = tk.StringVar()
+        self.query.trace_add("write", lambda *args: self.apply_filter())
+        self.entry_search = ttk.Entry(search_bar, textvariable=self.query, width=30)
+        self.entry_search.pack(side="left", padx=5)
+        self.entry_search.bind("<Return>", self.select_only_match)
+        self.entry_search.bind("<Escape>", lambda e: self.query.set(""))
         
-    def __init__(self, controller, table_id, status, callback):
+        self.category = tk.IntVar(value=0)
+        self.category_strip = tk.Frame(self, bg="white")
+        self.category_strip.pack(fill="x", padx=5)
+        self.menu_grid = MenuGrid(self, db, on_select)
+        self.menu_grid.pack(fill="both", expand=True, pady=5)
+        db.events.subscribe("availability_changed", self.menu_grid.update_availability)
+        self.bind("<Destroy>", self.on_destroy)
+
+    def on_destroy(self, event):
+        if event.widget is self:
+            self.db.events.unsubscribe("availability_changed", self.menu_grid.update_availability)
+
+    def build(self, catalog):
+        self.db.refresh_availability()
+        if self.query.get():
+            self.query.set("")
+        if catalog.version == self.version:
+            return
+        self.catalog = catalog
+        for w in self.category_strip.winfo_children():
+            w.destroy()
+        for cat_id, cat_name in [(0, "All")] + list(catalog.categories):
+            tk.Radiobutton(self.category_strip, text=cat_name, variable=self.category, value=cat_id, indicatoron=0,
+                           padx=10, pady=4, command=self.apply_filter).pack(side="left")
+        if self.category.get() not in catalog.items_by_category:
+            self.category.set(0)
+        self.version = catalog.version
+        self.apply_filter()
+
+    def apply_filter(self):
+        if self.catalog is None:
+            return
+        cat_id = self.category.get()
+        items = self.catalog.items_by_category.get(cat_id, []) if cat_id else \
+            list(itertools.chain.from_iterable(self.catalog.items_by_category.values()))
+        matches = self.catalog.search(self.query.get())
+        if matches is not None:
+            items = [item for item in items if item[0] in matches]
+        self.menu_grid.show(items)
+
+    def select_only_match(self, event):
+        if len(self.menu_grid.items) == 1 and self.db.inventory.can_make(self.menu_grid.items[0][0]):
+            self.on_select(self.menu_grid.items[0][0])
+            self.query.set("")
+
+class TableManagerWindow(tk.Toplevel):
+    def __init__(self, controller):
         tk.Toplevel.__init__(self)
         self.controller = controller
-        self.table_id = table_id
-        self.callback = callback
-        self.title(f"Manage Table {table_id}")
+        self.table_id = None
+        self.callback = None
+        self.current_order_id = None
+        self.in_use = False
         self.geometry("900x600")
+        self.protocol("WM_DELETE_WINDOW", self.close)
         
         left_panel = tk.Frame(self, width=300, bg="#ecf0f1")
         left_panel.pack(side="left", fill="y")
@@ -404,121 +3373,161 @@ class TableManagerWindow(tk.Toplevel):
         
         tk.Label(left_panel, text="CURRENT BILL", font=("Arial", 12, "bold"), bg="#ecf0f1", pady=10).pack()
         
-        self.order_list = tk.Listbox(left_panel, width=40, height=25)
-        self.order_list.pack(padx=10)
+        # One row per (item, price, status) with its quantity. bill_groups holds
+        # each group's (detail id, qty) lines; rows are updated in place.
+        self.bill_view = ttk.Treeview(left_panel, columns=("qty", "item", "amount", "status"), show="headings",
+                                      height=22, selectmode="browse")
+        for col, text, width, anchor in (("qty", "Qty", 40, "center"), ("item", "Item", 150, "w"),
+                                         ("amount", "Amount", 70, "e"), ("status", "Status", 70, "w")):
+            self.bill_view.heading(col, text=text)
+            self.bill_view.column(col, width=width, anchor=anchor)
+        self.bill_view.pack(padx=10)
         
         self.lbl_total = tk.Label(left_panel, text="Total: $0.00", font=("Arial", 14, "bold"), bg="#ecf0f1")
         self.lbl_total.pack(pady=10)
+        self.bill_groups = {}
+        self.bill_rows = {}
+        self.bill_keys = {}
         
         btn_frame = tk.Frame(left_panel, bg="#ecf0f1")
         btn_frame.pack(fill="x", padx=10)
         
+        tk.Button(btn_frame, text="Void Item", command=self.void_item, bg="#c0392b", fg="white").pack(fill="x", pady=2)
+        tk.Button(btn_frame, text="Re-price Item", command=self.reprice_item, bg="#8e44ad", fg="white").pack(fill="x", pady=2)
         tk.Button(btn_frame, text="Send to Kitchen", command=self.send_to_kitchen, bg="#f39c12", fg="white").pack(fill="x", pady=2)
         tk.Button(btn_frame, text="Checkout / Pay", command=self.checkout, bg="#27ae60", fg="white").pack(fill="x", pady=2)
         tk.Button(btn_frame, text="Occupy / Clear", command=self.toggle_occupancy, bg="#34495e", fg="white").pack(fill="x", pady=2)
 
-        self.notebook = ttk.Notebook(right_panel)
-        self.notebook.pack(fill="both", expand=True)
-        
-        categories = self.controller.db.get_data("SELECT id, name FROM categories")
-        for cat_id, cat_name in categories:
-            frame = tk.Frame(self.notebook, bg="white")
-            self.notebook.add(frame, text=cat_name)
-            self.populate_menu_grid(frame, cat_id)
+        self.menu_panel = MenuPanel(right_panel, controller.db, self.add_item)
+        self.menu_panel.pack(fill="both", expand=True)
 
+    def open(self, table_id, status, callback):
+        self.table_id = table_id
+        self.callback = callback
+        self.in_use = True
+        self.title(f"Manage Table {table_id}")
+        self.menu_panel.build(self.controller.db.menu.refresh())
         self.current_order_id = self.get_active_order()
         self.refresh_order_list()
+        self.deiconify()
+        self.lift()
 
-    def get_active_order(self):
-        res = self.controller.db.get_data("SELECT current_order_id FROM restaurant_tables WHERE id=?", (self.table_id,))
-        if res and res[0][0]:
-            return res[0][0]
-        return None
+    def close(self):
+        self.in_use = False
+        self.table_id = None
+        self.current_order_id = None
+        self.withdraw()
 
-    def populate_menu_grid(self, frame, cat_id):
-        items = self.controller.db.get_data("SELECT id, name, price FROM menu_items WHERE category_id=?", (cat_id,))
-        r, c = 0, 0
-        for i_id, name, price in items:
-            btn = tk.Button(frame, text=f"{name}\n${price:.2f}", 
-                            font=("Arial", 10), width=15, height=3,
-                            command=lambda x=i_id: self.add_item(x))
-            btn.grid(row=r, column=c, padx=5, pady=5)
-            c += 1
-            if c > 3:
-                c = 0
-                r += 1
+    def get_active_order(self):
+        return self.controller.service.table_order(self.table_id) or None
 
     def add_item(self, item_id):
-        if not self.controller.db.check_inventory(item_id):
+        try:
+            self.current_order_id, detail_id = self.controller.service.add_item(self.table_id, item_id, self.controller.sessions.user_id(self.controller.terminal))
+        except OutOfStockError:
             messagebox.showwarning("Out of Stock", "Not enough ingredients to make this item!")
             return
+        # The new line is known, so only its group's row changes; no re-read of the bill.
+        item = self.controller.db.menu.items.get(item_id)
+        if item is None:
+            self.refresh_order_list()
+            return
+        _, _, name, price = item
+        key = (name, price, "Cooking")
+        self.bill_groups.setdefault(key, []).append((detail_id, 1))
+        self.show_bill_group(key)
+        self.bill_view.see(self.bill_rows[key])
+        self.lbl_total.config(text=f"Total: ${self.controller.service.bill(self.current_order_id)[2]:.2f}")
 
-        self.controller.db.deduct_inventory(item_id)
-
-        if not self.current_order_id:
-            self.controller.db.run_query(
-                "INSERT INTO orders (table_id, server_id, timestamp, status) VALUES (?, ?, ?, 'Open')",
-                (self.table_id, SessionManager.current_user, datetime.now())
-            )
-            self.current_order_id = self.controller.db.cur.lastrowid
-            self.controller.db.run_query("UPDATE restaurant_tables SET status='Occupied', current_order_id=? WHERE id=?", 
-                                         (self.current_order_id, self.table_id))
-        
-        self.controller.db.run_query(
-            "INSERT INTO order_details (order_id, menu_item_id, quantity) VALUES (?, ?, 1)",
-            (self.current_order_id, item_id)
-        )
-        self.refresh_order_list()
+    def show_bill_group(self, key):
+        name, price, status = key
+        qty = sum(q for _, q in self.bill_groups[key])
+        values = (qty, name, f"${price * qty:.2f}", status)
+        row = self.bill_rows.get(key)
+        if row is None:
+            row = self.bill_rows[key] = self.bill_view.insert("", "end", values=values)
+            self.bill_keys[row] = key
+        else:
+            self.bill_view.item(row, values=values)
 
     def refresh_order_list(self):
-        self.order_list.delete(0, tk.END)
+        # Regroups the order's lines and touches only the rows whose group changed.
+        groups = {}
         total = 0.0
         if self.current_order_id:
-            items = self.controller.db.get_data("""
-                SELECT m.name, m.price, od.status 
-                FROM order_details od 
-                JOIN menu_items m ON od.menu_item_id = m.id 
-                WHERE od.order_id=?
-            """, (self.current_order_id,))
-            
-            for name, price, status in items:
-                self.order_list.insert(tk.END, f"{name} - ${price:.2f} ({status})")
-                total += price
+            for detail_id, name, price, qty, status in self.controller.service.bill_lines(self.current_order_id):
+                groups.setdefault((name, price, status or "New"), []).append((detail_id, qty))
+            total = self.controller.service.bill(self.current_order_id)[2]
+        for key in [k for k in self.bill_rows if k not in groups]:
+            row = self.bill_rows.pop(key)
+            del self.bill_keys[row]
+            self.bill_view.delete(row)
+        old, self.bill_groups = self.bill_groups, groups
+        for key, lines in groups.items():
+            if old.get(key) != lines:
+                self.show_bill_group(key)
         
         self.lbl_total.config(text=f"Total: ${total:.2f}")
 
+    def void_item(self):
+        selection = self.bill_view.selection()
+        if not selection:
+            return
+        key = self.bill_keys[selection[0]]
+        name, price, status = key
+        if status == "Void":
+            return
+        if messagebox.askyesno("Void", f"Void one {name} (${price:.2f}, {status})?"):
+            try:
+                self.controller.service.void_item(self.bill_groups[key][-1][0])
+            except (ValueError, ServiceError) as e:
+                messagebox.showwarning("Void", str(e))
+            self.refresh_order_list()
+
+    def reprice_item(self):
+        selection = self.bill_view.selection()
+        if not selection:
+            return
+        key = self.bill_keys[selection[0]]
+        name, price, status = key
+        if status == "Void":
+            return
+        new_price = simpledialog.askfloat("Re-price", f"New price for one {name} (now ${price:.2f}):",
+                                          initialvalue=price, minvalue=0)
+        if new_price is None:
+            return
+        try:
+            self.controller.service.reprice_item(self.bill_groups[key][-1][0], new_price)
+        except (ValueError, LookupError, ServiceError) as e:
+            messagebox.showwarning("Re-price", str(e))
+        self.refresh_order_list()
+
     def send_to_kitchen(self):
         if self.current_order_id:
-            self.controller.db.run_query("UPDATE order_details SET status='Cooking' WHERE order_id=? AND status IS NULL", 
-                                         (self.current_order_id,))
+            self.controller.service.send_to_kitchen(self.current_order_id)
             messagebox.showinfo("Success", "Order sent to kitchen!")
             self.refresh_order_list()
 
     def checkout(self):
         if not self.current_order_id: return
         
-        items = self.controller.db.get_data("""
-            SELECT m.price FROM order_details od 
-            JOIN menu_items m ON od.menu_item_id = m.id 
-            WHERE od.order_id=?
-        """, (self.current_order_id,))
-        
-        subtotal = sum(x[0] for x in items)
-        tax = subtotal * TAX_RATE
-        total = subtotal + tax
+        subtotal, tax, total = self.controller.service.bill(self.current_order_id)
         
         if messagebox.askyesno("Checkout", f"Subtotal: ${subtotal:.2f}\nTax: ${tax:.2f}\nTotal: ${total:.2f}\n\nConfirm Payment?"):
-            self.generate_receipt(self.current_order_id, subtotal, tax, total)
-
-            self.controller.db.run_query("UPDATE orders SET status='Completed', total_amount=? WHERE id=?", (total, self.current_order_id))
-            self.controller.db.run_query("UPDATE restaurant_tables SET status='Dirty', current_order_id=NULL WHERE id=?", (self.table_id,))
+            try:
+                receipt = self.controller.service.checkout(self.current_order_id, self.table_id)[3]
+            except (ValueError, ServiceError) as e:
+                messagebox.showwarning("Checkout", str(e))
+            else:
+                if receipt:
+                    messagebox.showinfo("Receipt", f"Receipt for order {self.current_order_id} saved to {receipt}")
             self.callback()
-            self.destroy()
+            self.close()
 
     def toggle_occupancy(self):
-        self.controller.db.run_query("UPDATE restaurant_tables SET status='Free' WHERE id=?", (self.table_id,))
+        self.controller.service.set_table_status(self.table_id, "Free")
         self.callback()
-        self.destroy()
+        self.close()
 
 class KitchenView(tk.Frame):
     def __init__(self, parent, controller):
@@ -529,54 +3538,100 @@ class KitchenView(tk.Frame):
         header.pack(fill="x")
         tk.Label(header, text="KITCHEN DISPLAY SYSTEM", fg="red", bg="#2c3e50", font=("Courier", 20, "bold")).pack(pady=10)
         tk.Button(header, text="REFRESH", command=self.refresh).pack(side="right", padx=10)
+        self.station = tk.StringVar(value="All")
+        stations = ttk.Combobox(header, textvariable=self.station, state="readonly", width=10,
+                                values=["All"] + controller.service.stations())
+        stations.pack(side="right", padx=10)
+        stations.bind("<<ComboboxSelected>>", self.change_station)
+        tk.Label(header, text="Station:", fg="white", bg="#2c3e50").pack(side="right")
         
         self.container = tk.Frame(self, bg="black")
         self.container.pack(fill="both", expand=True, padx=10, pady=10)
+        self.tickets = {}
+        self.ticket_frames = {}
+        self.ticket_labels = {}
+        self.ticket_slots = {}
+        self.refresh_pending = False
+        for event in ("order_created", "item_added", "item_bumped", "item_voided"):
+            controller.db.events.subscribe(event, self.schedule_refresh)
+        self.after(KITCHEN_TICK_MS, self.tick)
+
+    def schedule_refresh(self, **event):
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.after_idle(self.refresh)
+
+    def tick(self):
+        # Ages and ETAs move with the clock even when nothing is rung in.
+        if self.winfo_ismapped():
+            self.schedule_refresh()
+        self.after(KITCHEN_TICK_MS, self.tick)
+
+    def change_station(self, event=None):
+        for o_id in list(self.ticket_frames):
+            self.drop_ticket(o_id)
+        self.tickets = {}
         self.refresh()
 
+    @staticmethod
+    def layout(ticket):
+        return ticket.table_label, tuple(item[:4] for item in ticket.items)
+
+    def drop_ticket(self, o_id):
+        self.ticket_frames.pop(o_id).destroy()
+        self.ticket_labels.pop(o_id, None)
+        self.ticket_slots.pop(o_id, None)
+
     def refresh(self):
-        for w in self.container.winfo_children(): w.destroy()
-        
-        active_orders = self.controller.db.get_data("""
-            SELECT DISTINCT o.id, t.label, o.timestamp 
-            FROM orders o
-            JOIN restaurant_tables t ON o.table_id = t.id
-            JOIN order_details od ON o.id = od.order_id
-            WHERE od.status = 'Cooking'
-        """)
-        
-        col = 0
-        row = 0
-        for o_id, t_label, time_str in active_orders:
-            ticket = tk.Frame(self.container, bg="#fffde7", width=250)
-            ticket.grid(row=row, column=col, padx=10, pady=10, sticky="n")
-            
-            tk.Label(ticket, text=f"ORDER #{o_id}", font=("Courier", 12, "bold"), bg="#fffde7").pack(anchor="w")
-            tk.Label(ticket, text=f"{t_label} | {time_str[11:16]}", font=("Courier", 10), bg="#fffde7").pack(anchor="w")
-            tk.Frame(ticket, height=2, bg="black").pack(fill="x", pady=5)
-            
-            items = self.controller.db.get_data("""
-                SELECT m.name, od.id FROM order_details od
-                JOIN menu_items m ON od.menu_item_id = m.id
-                WHERE od.order_id = ? AND od.status = 'Cooking'
-            """, (o_id,))
-            
-            for item_name, item_detail_id in items:
-                f = tk.Frame(ticket, bg="#fffde7")
-                f.pack(fill="x", anchor="w")
-                tk.Label(f, text=f"- {item_name}", font=("Courier", 12), bg="#fffde7").pack(side="left")
-            
-            tk.Button(ticket, text="BUMP (DONE)", bg="#2ecc71", fg="white", 
-                      command=lambda oid=o_id: self.complete_order(oid)).pack(fill="x", pady=(10,0))
-            
-            col += 1
-            if col > 3:
-                col = 0
-                row += 1
+        self.refresh_pending = False
+        station = self.station.get()
+        tickets = self.controller.service.kitchen_tickets(None if station == "All" else station)
+        current = {t.order_id: t for t in tickets}
 
-    def complete_order(self, order_id):
-        self.controller.db.run_query("UPDATE order_details SET status='Served' WHERE order_id=?", (order_id,))
-        self.refresh()
+        for o_id in list(self.ticket_frames):
+            if o_id not in current or self.layout(current[o_id]) != self.layout(self.tickets[o_id]):
+                self.drop_ticket(o_id)
+
+        now = datetime.now()
+        for index, ticket in enumerate(tickets):
+            if ticket.order_id not in self.ticket_frames:
+                self.ticket_frames[ticket.order_id] = self.build_ticket(ticket)
+            slot = divmod(index, 4)
+            if self.ticket_slots.get(ticket.order_id) != slot:
+                self.ticket_frames[ticket.order_id].grid(row=slot[0], column=slot[1], padx=10, pady=10, sticky="n")
+                self.ticket_slots[ticket.order_id] = slot
+            header, eta = self.ticket_labels[ticket.order_id]
+            age = int((now - datetime.fromisoformat(ticket.timestamp)).total_seconds() // 60)
+            header.config(bg=ACCENT_COLOR if age >= KITCHEN_LATE_MINUTES else "#fffde7")
+            eta.config(text=f"{age} min old | ETA {ticket.expected_ready[11:16]}")
+
+        self.tickets = current
+
+    def build_ticket(self, ticket):
+        frame = tk.Frame(self.container, bg="#fffde7", width=250)
+
+        header = tk.Label(frame, text=f"ORDER #{ticket.order_id}", font=("Courier", 12, "bold"), bg="#fffde7")
+        header.pack(anchor="w", fill="x")
+        tk.Label(frame, text=f"{ticket.table_label} | {ticket.timestamp[11:16]}", font=("Courier", 10), bg="#fffde7").pack(anchor="w")
+        eta = tk.Label(frame, font=("Courier", 10), bg="#fffde7")
+        eta.pack(anchor="w")
+        self.ticket_labels[ticket.order_id] = (header, eta)
+        tk.Frame(frame, height=2, bg="black").pack(fill="x", pady=5)
+
+        for detail_id, item_name, station, course, ready in ticket.items:
+            f = tk.Frame(frame, bg="#fffde7")
+            f.pack(fill="x", anchor="w")
+            tk.Label(f, text=f"C{course} {item_name} [{station}]", font=("Courier", 11), bg="#fffde7").pack(side="left")
+            tk.Button(f, text="✓", bg="#2ecc71", fg="white", padx=4, pady=0,
+                      command=lambda d=detail_id: self.controller.service.bump_items([d])).pack(side="right")
+
+        tk.Button(frame, text="BUMP (DONE)", bg="#2ecc71", fg="white",
+                  command=lambda t=ticket: self.complete_ticket(t)).pack(fill="x", pady=(10,0))
+        return frame
+
+    def complete_ticket(self, ticket):
+        # Only the lines on this screen: a bar bump must not clear the grill's mains.
+        self.controller.service.bump_items([item[0] for item in ticket.items])
 
 class AdminView(tk.Frame):
     def __init__(self, parent, controller):
@@ -586,19 +3641,28 @@ class AdminView(tk.Frame):
         
         self.stats_frame = tk.Frame(self, bg=BG_COLOR)
         self.stats_frame.pack(fill="x", padx=20)
-        self.refresh()
         
+        tk.Button(self, text="Close Day (Z Report)", command=self.close_day, bg=THEME_COLOR, fg="white",
+                  font=("Arial", 11, "bold"), relief="flat", padx=15, pady=5).pack(anchor="w", padx=30, pady=20)
+
+    def close_day(self):
+        day = datetime.now().strftime("%Y-%m-%d")
+        if not messagebox.askyesno("Close Day", f"Run the end-of-day close for {day}?"):
+            return
+        sessions = self.controller.sessions
+        report = self.controller.service.close_day(day, sessions.user_id(self.controller.terminal))
+        path = write_z_report(report)
+        note = f"\n\n{report['open_orders']} orders are still open and not included." if report["open_orders"] else ""
+        messagebox.showinfo("Z Report", f"{report['orders']} orders, net ${report['subtotal']:,.2f}, "
+                                        f"tax ${report['tax']:,.2f}, total ${report['total']:,.2f}\n"
+                                        f"{report['voids']} voided items (${report['void_amount']:,.2f})\n\n"
+                                        f"Report saved to {path}{note}")
+        self.refresh()
+
     def refresh(self):
         for w in self.stats_frame.winfo_children(): w.destroy()
         
-        total_rev = self.controller.db.get_data("SELECT SUM(total_amount) FROM orders WHERE status='Completed'")[0][0] or 0.0
-        total_orders = self.controller.db.get_data("SELECT COUNT(*) FROM orders")[0][0]
-        top_item = self.controller.db.get_data("""
-            SELECT m.name, COUNT(od.id) as cnt FROM order_details od
-            JOIN menu_items m ON od.menu_item_id = m.id
-            GROUP BY m.name ORDER BY cnt DESC LIMIT 1
-        """)
-        top_item_name = top_item[0][0] if top_item else "N/A"
+        total_rev, total_orders, top_item_name = self.controller.service.dashboard_stats()
         
         stats = [
             ("Total Revenue", f"${total_rev:,.2f}"),
@@ -612,12 +3676,95 @@ class AdminView(tk.Frame):
             tk.Label(card, text=label, fg="#7f8c8d", bg="white").pack()
             tk.Label(card, text=val, font=("Arial", 20, "bold"), fg=THEME_COLOR, bg="white").pack()
 
+class DiagnosticsView(tk.Frame):
+    COLUMNS = (("count", "Calls", 60), ("total_ms", "Total ms", 80), ("avg_ms", "Avg ms", 70), ("p50_ms", "p50 ≤", 60),
+               ("p99_ms", "p99 ≤", 60), ("max_ms", "Max ms", 70), ("rows", "Rows", 70))
+
+    def __init__(self, parent, controller):
+        tk.Frame.__init__(self, parent, bg=BG_COLOR)
+        self.controller = controller
+        self.entries = {}
+
+        header = tk.Frame(self, bg="white", height=50)
+        header.pack(fill="x", pady=(0, 10))
+        tk.Label(header, text="QUERY DIAGNOSTICS", font=FONT_HEADER, bg="white").pack(side="left", padx=20, pady=10)
+        tk.Button(header, text="Export...", command=self.export).pack(side="right", padx=5)
+        tk.Button(header, text="Reset", command=self.reset).pack(side="right", padx=5)
+        tk.Button(header, text="Refresh", command=self.refresh).pack(side="right", padx=5)
+
+        self.tree = ttk.Treeview(self, columns=[c for c, _, _ in self.COLUMNS] + ["sql"], show="headings", height=15)
+        for col, title, width in self.COLUMNS:
+            self.tree.heading(col, text=title)
+            self.tree.column(col, width=width, anchor="e")
+        self.tree.heading("sql", text="Statement")
+        self.tree.column("sql", width=600)
+        self.tree.tag_configure("slow", foreground=ACCENT_COLOR)
+        self.tree.pack(fill="both", expand=True, padx=20)
+        self.tree.bind("<<TreeviewSelect>>", self.show_detail)
+
+        self.detail = tk.Text(self, height=10, font=("Courier", 9))
+        self.detail.pack(fill="x", padx=20, pady=10)
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        self.entries = {}
+        for entry in self.controller.db.stats.snapshot():
+            values = [entry["count"]] + [f"{entry[c]:.2f}" for c in ("total_ms", "avg_ms", "p50_ms", "p99_ms", "max_ms")]
+            iid = self.tree.insert("", tk.END, values=values + [entry["rows"], entry["sql"]],
+                                   tags=("slow",) if entry["slow"] else ())
+            self.entries[iid] = entry
+
+    def show_detail(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        entry = self.entries[selection[0]]
+        lines = [entry["sql"], "", "Latency histogram:"]
+        lines += [f"  {bucket:>8} ms  {n}" for bucket, n in entry["histogram"].items() if n]
+        if entry["slow"]:
+            lines += ["", f"Slow ({entry['slow']['ms']:.1f} ms at {entry['slow']['seen_at']}), query plan:"]
+            lines += [f"  {step}" for step in entry["slow"]["plan"]]
+        self.detail.delete("1.0", tk.END)
+        self.detail.insert("1.0", "\n".join(lines))
+
+    def reset(self):
+        self.controller.db.stats.reset()
+        self.refresh()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="query_metrics.json",
+                                            filetypes=[("JSON", "*.json")])
+        if path:
+            self.controller.db.stats.export(path)
+            messagebox.showinfo("Export", f"Query metrics written to {path}")
+
 class RestaurantApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, service_url=None, db_name=DB_NAME, terminal=None):
         tk.Tk.__init__(self)
         self.title("Gilded Fork Enterprise System")
         self.geometry("1280x720")
-        self.db = DatabaseManager()
+        # With a service URL every order, table, reservation, kitchen and
+        # report call goes to the server, which also runs the holds timer and
+        # the inventory flush. The local DatabaseManager then only backs what
+        # still reads the shared file directly: logins, the menu grid and its
+        # availability, change notifications and the query diagnostics view.
+        self.db = DatabaseManager(db_name)
+        self.notifier = ChangeNotifier(self, self.db)
+        self.notifier.start()
+        if service_url:
+            self.receipts = None
+            self.service = ServiceClient(service_url)
+        else:
+            self.receipts = ReceiptWriter(ReceiptArchive(db_name))
+            self.service = RestaurantService(self.db, self.receipts)
+            self.after(INVENTORY_FLUSH_MS, self.flush_inventory)
+            self.after(RESERVATION_CHECK_MS, self.apply_reservation_holds)
+            # A brand-new database gets the sample floor and menu; one that was
+            # already set up is left as it is (seed_data also skips any menu).
+            if self.db.created:
+                self.db.seed_data()
+        self.sessions = SessionManager(self.db)
+        self.terminal = terminal or socket.gethostname()
         
         self.container = tk.Frame(self)
         self.container.pack(side="top", fill="both", expand=True)
@@ -625,6 +3772,7 @@ class RestaurantApp(tk.Tk):
         self.container.grid_columnconfigure(0, weight=1)
         
         self.frames = {}
+        self.table_windows = []
         
         for F in (LoginScreen, MainDashboard):
             page_name = F.__name__
@@ -637,7 +3785,1059 @@ class RestaurantApp(tk.Tk):
     def show_frame(self, page_name):
         frame = self.frames[page_name]
         frame.tkraise()
+        if hasattr(frame, "on_show"):
+            frame.on_show()
+
+    def flush_inventory(self):
+        # A locked or busy database only skips this round; the timer keeps running.
+        try:
+            self.db.flush_inventory()
+        except sqlite3.Error as e:
+            print(f"Inventory flush failed: {e}")
+        finally:
+            self.after(INVENTORY_FLUSH_MS, self.flush_inventory)
+
+    def apply_reservation_holds(self):
+        try:
+            self.db.apply_reservation_holds()
+        except sqlite3.Error as e:
+            print(f"Reservation hold check failed: {e}")
+        finally:
+            self.after(RESERVATION_CHECK_MS, self.apply_reservation_holds)
+
+    def open_table_window(self, table_id, status, callback):
+        for window in self.table_windows:
+            if window.in_use and window.table_id == table_id:
+                window.lift()
+                return window
+        window = next((w for w in self.table_windows if not w.in_use), None)
+        if window is None:
+            window = TableManagerWindow(self)
+            self.table_windows.append(window)
+        window.open(table_id, status, callback)
+        return window
+
+def seed_history(db, days, orders_per_day, items_per_order=4):
+    # Lines carry their price and orders their running totals, as if they had
+    # been rung up, unless the database predates those columns (bench-indexes
+    # seeds the baseline schema and lets migration 9 backfill them).
+    prices = dict(db.get_data("SELECT id, price FROM menu_items"))
+    menu_ids = list(prices)
+    table_ids = [r[0] for r in db.get_data("SELECT id FROM restaurant_tables")]
+    priced = "unit_price" in db.table_columns(db.conn, "main", "order_details")
+    start = datetime.now() - timedelta(days=days)
+    next_order = (db.get_data("SELECT COALESCE(MAX(id), 0) FROM orders")[0][0]) + 1
+    rng = random.Random(42)
+    for day in range(days):
+        orders, details = [], []
+        day_start = start + timedelta(days=day)
+        live = day == days - 1
+        for _ in range(orders_per_day):
+            ts = day_start + timedelta(minutes=rng.randint(11 * 60, 23 * 60))
+            status = "Open" if live and rng.random() < 0.2 else "Completed"
+            item_status = "Cooking" if status == "Open" else "Served"
+            subtotal = 0.0
+            for _ in range(items_per_order):
+                menu_item_id = rng.choice(menu_ids)
+                subtotal += prices[menu_item_id]
+                details.append((next_order, menu_item_id, 1, item_status, prices[menu_item_id]))
+            subtotal = round(subtotal, 2)
+            tax = round(subtotal * TAX_RATE, 2)
+            orders.append((next_order, rng.choice(table_ids), 1, ts, status, subtotal + tax, subtotal, tax))
+            next_order += 1
+        if priced:
+            db.cur.executemany("INSERT INTO orders (id, table_id, server_id, timestamp, status, total_amount, subtotal, tax) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", orders)
+            db.cur.executemany("INSERT INTO order_details (order_id, menu_item_id, quantity, status, unit_price) "
+                               "VALUES (?, ?, ?, ?, ?)", details)
+        else:
+            db.cur.executemany("INSERT INTO orders (id, table_id, server_id, timestamp, status, total_amount) VALUES (?, ?, ?, ?, ?, 0.0)",
+                               [o[:5] for o in orders])
+            db.cur.executemany("INSERT INTO order_details (order_id, menu_item_id, quantity, status) VALUES (?, ?, ?, ?)",
+                               [d[:4] for d in details])
+    db.conn.commit()
+    return next_order - 1
+
+def time_query(db, query, params, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.get_data(query, params)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def bench_indexes(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db = DatabaseManager(path, migrate=False)
+    db.seed_data()
+    print(f"Seeding {args.days} days x {args.orders_per_day} orders into {path} ...")
+    last_order = seed_history(db, args.days, args.orders_per_day)
+    queries = [
+        ("KDS active tickets", """
+            SELECT DISTINCT o.id, t.label, o.timestamp
+            FROM orders o
+            JOIN restaurant_tables t ON o.table_id = t.id
+            JOIN order_details od ON o.id = od.order_id
+            WHERE od.status = 'Cooking'
+        """, ()),
+        ("Bill for one order", """
+            SELECT m.name, m.price, od.status
+            FROM order_details od
+            JOIN menu_items m ON od.menu_item_id = m.id
+            WHERE od.order_id=?
+        """, (last_order,)),
+        ("Recipe lookup", "SELECT inventory_id, amount_needed FROM recipe_links WHERE menu_item_id=?", (1,)),
+        ("Open orders", "SELECT id, timestamp FROM orders WHERE status='Open' ORDER BY timestamp", ()),
+        ("Table by order", "SELECT id FROM restaurant_tables WHERE current_order_id=?", (last_order,)),
+    ]
+    before = [time_query(db, q, p, args.repeat) for _, q, p in queries]
+    db.run_migrations()
+    after = [time_query(db, q, p, args.repeat) for _, q, p in queries]
+    print(f"{'Query':<22} {'Before (ms)':>12} {'After (ms)':>12} {'Speedup':>9}")
+    for (name, _, _), b, a in zip(queries, before, after):
+        print(f"{name:<22} {b:>12.3f} {a:>12.3f} {b / a if a else 0:>8.1f}x")
+    db.close()
+
+def stress_worker(path, table_id, menu_item_id, attempts):
+    db = DatabaseManager(path)
+    placed = 0
+    for _ in range(attempts):
+        try:
+            db.place_order_item(table_id, 1, menu_item_id)
+            placed += 1
+        except OutOfStockError:
+            pass
+    db.close()
+    return placed
+
+def stress_orders(args):
+    path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    db = DatabaseManager(path)
+    db.seed_data()
+    item_id, inv_id, amount = db.get_data("SELECT menu_item_id, inventory_id, amount_needed FROM recipe_links LIMIT 1")[0]
+    db.run_query("UPDATE inventory SET quantity=? WHERE id=?", (args.stock, inv_id))
+    table_ids = [r[0] for r in db.get_data("SELECT id FROM restaurant_tables")]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        jobs = [(path, table_ids[i % len(table_ids)], item_id, args.attempts) for i in range(args.processes)]
+        placed = sum(pool.starmap(stress_worker, jobs))
+    elapsed = time.perf_counter() - start
+
+    remaining = db.get_data("SELECT quantity FROM inventory WHERE id=?", (inv_id,))[0][0]
+    unapplied = db.get_data("SELECT COUNT(*) FROM inventory_journal WHERE applied = 0")[0][0]
+    journaled = -db.get_data("SELECT COALESCE(SUM(delta), 0) FROM inventory_journal WHERE inventory_id=?", (inv_id,))[0][0]
+    lines, line_total = db.get_data("SELECT COUNT(*), COALESCE(SUM(unit_price * quantity), 0) FROM order_details "
+                                    "WHERE menu_item_id=?", (item_id,))[0]
+    billed = db.get_data("SELECT COALESCE(SUM(subtotal), 0) FROM orders")[0][0]
+    rolled_up = db.get_data("SELECT COALESCE(SUM(quantity), 0) FROM rollup_items WHERE menu_item_id=?", (item_id,))[0][0]
+    db.close()
+    print(f"{args.processes} processes x {args.attempts} attempts in {elapsed:.2f}s: "
+          f"{placed} placed, {lines} order lines, {remaining} left of {args.stock}, {unapplied} unapplied journal rows")
+    expected = min(args.stock // amount, args.processes * args.attempts)
+    checks = [
+        (placed == expected, f"placed {placed} items, expected {expected}: stock was oversold or sales were refused"),
+        (lines == placed, f"{lines} order lines for {placed} placed items"),
+        (remaining == args.stock - placed * amount, f"{remaining} left, expected {args.stock - placed * amount}: lost stock update"),
+        (remaining >= 0, f"stock went negative ({remaining})"),
+        (journaled == placed * amount, f"journal deducted {journaled}, expected {placed * amount}"),
+        (not unapplied, f"{unapplied} journal rows were never applied"),
+        (round(billed, 2) == round(line_total, 2), f"bills total {billed:.2f} but lines total {line_total:.2f}: lost bill update"),
+        (rolled_up == placed, f"rollups count {rolled_up} sold, expected {placed}"),
+    ]
+    failures = [message for ok, message in checks if not ok]
+    if failures:
+        raise SystemExit("FAILED: " + "; ".join(failures))
+    print("OK: no overselling and no lost stock, bill or rollup updates")
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run_concurrency(path, journal_mode, writers, readers, seconds):
+    db = DatabaseManager(path, journal_mode=journal_mode)
+    db.seed_data()
+    db.run_query("UPDATE inventory SET quantity=1000000")
+    item_ids = [r[0] for r in db.get_data("SELECT id FROM menu_items")]
+    table_ids = [r[0] for r in db.get_data("SELECT id FROM restaurant_tables")]
+    latencies = {"POS write": [], "KDS read": []}
+    deadline = time.perf_counter() + seconds
+
+    def pos(worker):
+        rng = random.Random(worker)
+        samples = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            db.place_order_item(rng.choice(table_ids), 1, rng.choice(item_ids))
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies["POS write"].extend(samples)
+
+    def kds():
+        samples = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            db.get_kitchen_tickets()
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies["KDS read"].extend(samples)
+
+    threads = [threading.Thread(target=pos, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=kds) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    db.close()
+    return latencies
+
+def bench_concurrency(args):
+    print(f"{'Mode':<8} {'Operation':<10} {'Ops/s':>9} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for mode in ("DELETE", "WAL"):
+        path = os.path.join(tempfile.mkdtemp(), f"concurrency_{mode.lower()}.db")
+        latencies = run_concurrency(path, mode, args.writers, args.readers, args.seconds)
+        for op, samples in latencies.items():
+            print(f"{mode:<8} {op:<10} {len(samples) / args.seconds:>9.0f} "
+                  f"{percentile(samples, 50):>10.3f} {percentile(samples, 99):>10.3f}")
+
+def bench_reservations(args):
+    path = os.path.join(tempfile.mkdtemp(), "reservations.db")
+    db = DatabaseManager(path)
+    db.seed_data()
+    rng = random.Random(7)
+    db.cur.executemany("INSERT INTO restaurant_tables (label, capacity) VALUES (?, ?)",
+                       [(f"T-{i}", rng.choice((2, 2, 4, 4, 6, 8))) for i in range(21, args.tables + 1)])
+    db.conn.commit()
+    db.reservations.invalidate()
+
+    base = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    start = time.perf_counter()
+    booked = 0
+    for _ in range(args.bookings):
+        when = base + timedelta(days=rng.randrange(args.days), minutes=rng.randrange(11 * 4, 22 * 4) * 15)
+        try:
+            db.book_table("Guest", rng.randint(1, 6), when)
+            booked += 1
+        except ReservationConflictError:
+            pass
+    print(f"Booked {booked}/{args.bookings} reservations on {args.tables} tables in {time.perf_counter() - start:.2f}s")
+
+    samples = []
+    for _ in range(args.queries):
+        when = base + timedelta(days=rng.randrange(args.days), hours=19, minutes=30)
+        t = time.perf_counter()
+        db.reservations.best_table(5, when, when + timedelta(minutes=RESERVATION_MINUTES))
+        samples.append((time.perf_counter() - t) * 1000)
+    print(f"best_table(5 guests, 19:30): p50 {percentile(samples, 50):.4f} ms, p99 {percentile(samples, 99):.4f} ms")
+    db.close()
+
+def synthetic_service_night(tables=200, parties=1000, seed=11):
+    rng = random.Random(seed)
+    layout = [[t, rng.choice((2, 2, 4, 4, 4, 6, 8)), f"Room {t % 4 + 1}", t // 4] for t in range(1, tables + 1)]
+    events = []
+    for p in range(1, parties + 1):
+        size = rng.choice((1, 2, 2, 2, 3, 4, 4, 5, 6, 8, 10))
+        start = 17 * 60 + rng.randrange(0, 5 * 60, 15)
+        minutes = rng.randrange(60, 135, 15)
+        kind = "booking" if rng.random() < 0.7 else "walk_in"
+        events.append({"party": p, "size": size, "start": start, "minutes": minutes, "kind": kind,
+                       "leaves": start + minutes - rng.choice((0, 0, 15, 30))})
+    return {"tables": layout, "parties": events}
+
+def service_night_from_db(path, day):
+    db = DatabaseManager(path)
+    base = datetime.fromisoformat(day)
+    parties = []
+    for res_id, size, start, end in db.get_data("""
+            SELECT id, party_size, start_time, end_time FROM reservations
+            WHERE start_time >= ? AND start_time < ? AND status != 'Cancelled'
+    """, (base, base + timedelta(days=1))):
+        a = int((datetime.fromisoformat(str(start)) - base).total_seconds() // 60)
+        b = int((datetime.fromisoformat(str(end)) - base).total_seconds() // 60)
+        parties.append({"party": res_id, "size": size, "start": a, "minutes": b - a, "kind": "booking", "leaves": b})
+    night = {"tables": [list(t) for t in db.get_table_layout()], "parties": parties}
+    db.close()
+    return night
+
+def replay_service_night(night):
+    assigner = TableAssigner(night["tables"])
+    bookings = [Party(p["party"], p["size"], p["start"], p["start"] + p["minutes"])
+                for p in night["parties"] if p["kind"] == "booking"]
+    timeline = []
+    for p in night["parties"]:
+        if p["kind"] == "walk_in":
+            timeline.append((p["start"], 1, p))
+        timeline.append((p["leaves"], 0, p))
+    timeline.sort(key=lambda e: (e[0], e[1]))
+
+    latencies = {"solve bookings": [], "walk-in": [], "leave": []}
+    start = time.perf_counter()
+    assigner.solve(bookings)
+    latencies["solve bookings"].append((time.perf_counter() - start) * 1000)
+    for when, kind, p in timeline:
+        t = time.perf_counter()
+        if kind == 1:
+            assigner.place(Party(p["party"], p["size"], when, when + p["minutes"]))
+            latencies["walk-in"].append((time.perf_counter() - t) * 1000)
+        else:
+            assigner.release(p["party"], when)
+            latencies["leave"].append((time.perf_counter() - t) * 1000)
+    return assigner, latencies, time.perf_counter() - start
+
+def bench_assign(args):
+    nights = []
+    for path in args.night or []:
+        with open(path, encoding="utf-8") as f:
+            nights.append((path, json.load(f)))
+    if args.db:
+        nights.append((f"{args.db} {args.day}", service_night_from_db(args.db, args.day)))
+    if not nights:
+        nights.append(("synthetic", synthetic_service_night(args.tables, args.parties)))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(nights[-1][1], f)
+
+    for name, night in nights:
+        assigner, latencies, elapsed = replay_service_night(night)
+        stats = assigner.stats()
+        print(f"{name}: {len(night['tables'])} tables, {len(night['parties'])} parties replayed in {elapsed * 1000:.1f} ms")
+        print(f"  seated {stats['parties_seated']} parties / {stats['covers']} covers, "
+              f"{stats['wasted_seats']} wasted seats, {stats['turned_away']} turned away, {stats['waiting']} still waiting")
+        for op, samples in latencies.items():
+            print(f"  {op:<15} n={len(samples):<5} p50 {percentile(samples, 50):.3f} ms  p99 {percentile(samples, 99):.3f} ms")
+
+def synthetic_restaurant(db, tables=120, menu_items=300, ingredients=400, days=365, orders_per_day=150, stock=10 ** 9, seed=7):
+    # Grows the seeded database into a larger restaurant: extra tables in a few
+    # rooms, a menu whose items each use 1-4 ingredients, and order history.
+    rng = random.Random(seed)
+    cat_ids = [r[0] for r in db.get_data("SELECT id FROM categories")]
+    with db.transaction() as cur:
+        have = cur.execute("SELECT COUNT(*) FROM restaurant_tables").fetchone()[0]
+        cur.executemany("INSERT INTO restaurant_tables (label, capacity, room, position) VALUES (?, ?, ?, ?)",
+                        [(f"T-{n}", rng.choice((2, 2, 4, 4, 6, 8)), f"Room {n // 40 + 1}", n)
+                         for n in range(have + 1, tables + 1)])
+        first_inv = cur.execute("SELECT COALESCE(MAX(id), 0) FROM inventory").fetchone()[0] + 1
+        cur.executemany("INSERT INTO inventory (name, quantity) VALUES (?, ?)",
+                        [(f"Ingredient {n}", 0) for n in range(ingredients)])
+        cur.execute("UPDATE inventory SET quantity=?", (stock,))
+        inv_ids = list(range(first_inv, first_inv + ingredients))
+        first_item = cur.execute("SELECT COALESCE(MAX(id), 0) FROM menu_items").fetchone()[0] + 1
+        cur.executemany("INSERT INTO menu_items (category_id, name, price) VALUES (?, ?, ?)",
+                        [(rng.choice(cat_ids), f"Dish {n}", round(rng.uniform(3, 45), 2)) for n in range(menu_items)])
+        cur.executemany("INSERT INTO recipe_links (menu_item_id, inventory_id, amount_needed) VALUES (?, ?, ?)",
+                        [(item_id, inv_id, rng.randint(1, 3))
+                         for item_id in range(first_item, first_item + menu_items)
+                         for inv_id in rng.sample(inv_ids, rng.randint(1, 4))])
+    if days:
+        seed_history(db, days, orders_per_day)
+        db.rebuild_rollups()
+    db.inventory.invalidate()
+
+def start_service_thread(service):
+    server = ServiceServer(service, port=0)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="service-loop", daemon=True).start()
+    ready.wait()
+    return server, loop
+
+def replay_rush(service, servers=8, tickets=25, items_per_ticket=4, cooks=2, kitchen_ms=50, seed=7):
+    # N servers each work their own section: open a tab, add items one tap at a
+    # time, read the bill, check out and clear the table. Cooks poll the KDS
+    # and bump the oldest ticket. Every call is timed per operation.
+    tables = [row[0] for row in service.tables()]
+    menu = [row[0] for row in service.menu()]
+    latencies = {op: [] for op in ("add_item", "bill", "checkout", "clear_table", "kds_refresh", "bump")}
+    lock = threading.Lock()
+    out_of_stock = []
+    done = threading.Event()
+
+    def timed(samples, op, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        samples.setdefault(op, []).append((time.perf_counter() - start) * 1000)
+        return result
+
+    def record(samples):
+        with lock:
+            for op, values in samples.items():
+                latencies[op].extend(values)
+
+    def server(index):
+        rng = random.Random(seed * 1000 + index)
+        section = tables[index::servers] or tables
+        samples = {}
+        missed = 0
+        for n in range(tickets):
+            table_id = section[n % len(section)]
+            order_id = None
+            for _ in range(items_per_ticket):
+                try:
+                    order_id, _ = timed(samples, "add_item", service.add_item, table_id, rng.choice(menu), index + 1)
+                except OutOfStockError:
+                    missed += 1
+            if order_id:
+                timed(samples, "bill", service.bill, order_id)
+                timed(samples, "checkout", service.checkout, order_id, table_id)
+            timed(samples, "clear_table", service.set_table_status, table_id, "Free")
+        record(samples)
+        with lock:
+            out_of_stock.append(missed)
+
+    def cook():
+        samples = {}
+        while not done.is_set():
+            tickets_now = timed(samples, "kds_refresh", service.kitchen_tickets)
+            if tickets_now:
+                timed(samples, "bump", service.bump_order, tickets_now[0].order_id)
+            done.wait(kitchen_ms / 1000)
+        record(samples)
+
+    waiters = [threading.Thread(target=server, args=(i,)) for i in range(servers)]
+    kitchen = [threading.Thread(target=cook) for _ in range(cooks)]
+    start = time.perf_counter()
+    for t in waiters + kitchen:
+        t.start()
+    for t in waiters:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for t in kitchen:
+        t.join()
+    return latencies, elapsed, sum(out_of_stock)
+
+def bench_kitchen(args):
+    path = os.path.join(tempfile.mkdtemp(), "kitchen.db")
+    db = DatabaseManager(path)
+    db.seed_data()
+    synthetic_restaurant(db, tables=max(args.tickets, 20), menu_items=120, ingredients=80, days=0)
+    rng = random.Random(args.seed)
+    menu = [row[0] for row in db.get_data("SELECT id FROM menu_items")]
+    tables = [row[0] for row in db.get_data("SELECT id FROM restaurant_tables")]
+    for n in range(args.tickets):
+        for _ in range(args.items):
+            db.place_order_item(tables[n], 1, rng.choice(menu))
+
+    timings = {"tickets (all)": [], "tickets (station)": [], "bump item": []}
+    stations = db.get_stations()
+    for n in range(args.repeat):
+        start = time.perf_counter()
+        tickets = db.get_kitchen_tickets()
+        timings["tickets (all)"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        db.get_kitchen_tickets(stations[n % len(stations)])
+        timings["tickets (station)"].append((time.perf_counter() - start) * 1000)
+        if tickets:
+            start = time.perf_counter()
+            db.bump_items([tickets[0].items[0][0]])
+            timings["bump item"].append((time.perf_counter() - start) * 1000)
+            db.place_order_item(tables[n % args.tickets], 1, rng.choice(menu))
+
+    tickets = db.get_kitchen_tickets()
+    print(f"{len(tickets)} open tickets, {sum(len(t.items) for t in tickets)} lines across {', '.join(stations)}")
+    for t in tickets[:3]:
+        print(f"  next up: #{t.order_id} {t.table_label} opened {t.timestamp[11:16]}, ETA {t.expected_ready[11:16]}")
+    for op, samples in timings.items():
+        print(f"{op:<18} p50 {percentile(samples, 50):.3f} ms  p99 {percentile(samples, 99):.3f} ms")
+    db.close()
+
+def bench_logins(args):
+    # Half the users still carry pre-salting SHA-256 hashes; the first login
+    # of each upgrades it. One in ten attempts uses a wrong password.
+    path = os.path.join(tempfile.mkdtemp(), "logins.db")
+    db = DatabaseManager(path)
+    users = [(f"user{n}", f"pw{n}") for n in range(args.users)]
+    with db.transaction() as cur:
+        cur.executemany("INSERT INTO users (username, password_hash, role) VALUES (?, ?, 'Server')",
+                        [(u, hashlib.sha256(p.encode()).hexdigest() if n % 2 else hash_password(p, args.iterations))
+                         for n, (u, p) in enumerate(users)])
+    sessions = SessionManager(db, args.iterations, args.workers)
+    rng = random.Random(args.seed)
+    attempts = [[(f"T{t}",) + (rng.choice(users) if rng.random() > 0.1 else (rng.choice(users)[0], "wrong"))
+                 for _ in range(args.logins)] for t in range(args.terminals)]
+    latencies = {"login": [], "rejected": []}
+    lock = threading.Lock()
+
+    def terminal(queue_):
+        for name, username, password in queue_:
+            start = time.perf_counter()
+            session = sessions.submit(name, username, password).result()
+            ms = (time.perf_counter() - start) * 1000
+            role = sessions.role(session.user_id) if session else None
+            with lock:
+                latencies["login" if role else "rejected"].append(ms)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=terminal, args=(q,)) for q in attempts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    legacy = db.get_data("SELECT COUNT(*) FROM users WHERE password_hash NOT LIKE 'pbkdf2_sha256$%'")[0][0]
+    sessions.close()
+    db.close()
+
+    print(f"{args.terminals} terminals x {args.logins} logins, {args.iterations} PBKDF2 iterations on "
+          f"{args.workers} workers: {elapsed:.2f}s, {args.terminals * args.logins / elapsed:.1f} logins/s")
+    print(f"{len(sessions.sessions)} terminals logged in, {args.users // 2 - legacy} of {args.users // 2} legacy hashes upgraded")
+    for op, samples in latencies.items():
+        print(f"{op:<9} {len(samples):>5}  p50 {percentile(samples, 50):.1f} ms  p99 {percentile(samples, 99):.1f} ms")
+    p99 = percentile(latencies["login"] + latencies["rejected"], 99)
+    if p99 > args.budget_ms:
+        raise SystemExit(f"OVER BUDGET: p99 login {p99:.1f} ms > {args.budget_ms:.0f} ms")
+    print(f"OK: p99 login {p99:.1f} ms is within the {args.budget_ms:.0f} ms budget")
+
+def seed_business_day(db, day, orders, items_per_order=4, void_rate=0.03, open_rate=0.02, seed=7):
+    # Writes a whole trading day in bulk, as the live path would have left it:
+    # billed totals on each order, captured prices and journal rows for every
+    # line, with voids split between before serving (restocked) and after.
+    rng = random.Random(seed)
+    menu = db.get_data("SELECT id, price FROM menu_items")
+    recipes = {}
+    for menu_item_id, inv_id, amount in db.get_data("SELECT menu_item_id, inventory_id, amount_needed FROM recipe_links"):
+        recipes.setdefault(menu_item_id, []).append((inv_id, amount))
+    table_ids = [r[0] for r in db.get_data("SELECT id FROM restaurant_tables")]
+    server_ids = [r[0] for r in db.get_data("SELECT id FROM users")]
+    start = datetime.strptime(day, "%Y-%m-%d")
+    next_order = db.get_data("SELECT COALESCE(MAX(id), 0) FROM orders")[0][0] + 1
+    next_detail = db.get_data("SELECT COALESCE(MAX(id), 0) FROM order_details")[0][0] + 1
+    order_rows, detail_rows, journal_rows = [], [], []
+    for order_id in range(next_order, next_order + orders):
+        ts = start + timedelta(minutes=rng.randint(11 * 60, 23 * 60 - 1), seconds=rng.randint(0, 59))
+        status = "Open" if rng.random() < open_rate else "Completed"
+        subtotal = 0.0
+        for _ in range(items_per_order):
+            menu_item_id, price = rng.choice(menu)
+            void = rng.random() < void_rate
+            restocked = void and rng.random() < 0.5
+            line_status = "Void" if void else "Served" if status == "Completed" else "Cooking"
+            detail_rows.append((next_detail, order_id, menu_item_id, 1, line_status, price))
+            for inv_id, amount in recipes.get(menu_item_id, ()):
+                journal_rows.append((inv_id, -amount, next_detail, ts))
+                if restocked:
+                    journal_rows.append((inv_id, amount, next_detail, ts))
+            if not void:
+                subtotal += price
+            next_detail += 1
+        subtotal = round(subtotal, 2)
+        tax = round(subtotal * TAX_RATE, 2)
+        order_rows.append((order_id, rng.choice(table_ids), rng.choice(server_ids), ts, status, subtotal, tax, subtotal + tax))
+    with db.transaction() as cur:
+        cur.executemany("INSERT INTO orders (id, table_id, server_id, timestamp, status, subtotal, tax, total_amount) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", order_rows)
+        cur.executemany("INSERT INTO order_details (id, order_id, menu_item_id, quantity, status, unit_price) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", detail_rows)
+        cur.executemany("INSERT INTO inventory_journal (inventory_id, delta, order_detail_id, created_at, applied) "
+                        "VALUES (?, ?, ?, ?, 1)", journal_rows)
+        # These rows never moved stock, so engines reload instead of replaying them.
+        cur.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'inventory_version'")
+    return len(detail_rows), len(journal_rows)
+
+def bench_close(args):
+    path = os.path.join(tempfile.mkdtemp(), "close.db")
+    db = DatabaseManager(path)
+    db.seed_data()
+    synthetic_restaurant(db, menu_items=args.menu_items, days=args.history_days, orders_per_day=150, seed=args.seed)
+    with db.transaction() as cur:
+        cur.executemany("INSERT INTO users (username, password_hash, role) VALUES (?, '!', 'Server')",
+                        [(f"server{n}",) for n in range(1, args.servers + 1)])
+    # The day before the generated history starts, so no history orders land on it.
+    day = (datetime.now() - timedelta(days=args.history_days + 1)).strftime("%Y-%m-%d")
+    start = time.perf_counter()
+    lines, journal = seed_business_day(db, day, args.orders, args.items, seed=args.seed)
+    print(f"Built {day}: {args.orders} orders, {lines} lines, {journal} journal rows on top of "
+          f"{args.history_days} days of history in {time.perf_counter() - start:.1f}s ({path})")
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        report = db.close_day(day)
+        timings.append(time.perf_counter() - start)
+    report_path = write_z_report(report, os.path.dirname(path))
+    snapshot = db.get_data("SELECT COUNT(*) FROM day_close_lines WHERE day=?", (day,))[0][0]
+    db.close()
+
+    item_sales = round(sum(row[3] for row in report["sections"]["item"]), 2)
+    print(f"Close: {report['orders']} orders, {report['items']} items, net {report['subtotal']:,.2f} "
+          f"(items sum {item_sales:,.2f}), tax {report['tax']:,.2f}, {report['voids']} voids, "
+          f"{report['open_orders']} still open")
+    print(f"{snapshot} snapshot lines, report {report_path}")
+    print(f"close-day over {args.runs} runs: best {min(timings):.3f}s, worst {max(timings):.3f}s")
+    if max(timings) > args.budget_s:
+        raise SystemExit(f"OVER BUDGET: close took {max(timings):.2f}s > {args.budget_s:.1f}s")
+
+def bench_service(args):
+    path = os.path.join(tempfile.mkdtemp(), "service.db")
+    db = DatabaseManager(path)
+    db.seed_data()
+    start = time.perf_counter()
+    synthetic_restaurant(db, args.tables, args.menu_items, args.ingredients, args.days, args.orders_per_day, seed=args.seed)
+    print(f"Built {args.tables} tables, {args.menu_items} menu items, {args.ingredients} ingredients and "
+          f"{args.days} days x {args.orders_per_day} orders in {time.perf_counter() - start:.1f}s ({path})")
+
+    service = RestaurantService(db)
+    if args.api:
+        server, loop = start_service_thread(service)
+        service = ServiceClient(f"http://{server.host}:{server.port}")
+    latencies, elapsed, missed = replay_rush(service, args.servers, args.tickets, args.items, args.cooks,
+                                             args.kitchen_ms, args.seed)
+    if args.api:
+        asyncio.run_coroutine_threadsafe(server.shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    if args.metrics:
+        db.stats.export(args.metrics)
+    db.close()
+
+    print(f"Rush: {args.servers} servers x {args.tickets} tickets x {args.items} items, {args.cooks} cooks, "
+          f"{elapsed:.2f}s via {'HTTP API' if args.api else 'in-process service'}, {missed} out-of-stock taps")
+    print(f"{'Operation':<12} {'Count':>7} {'Ops/s':>9} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    results = {}
+    for op, samples in latencies.items():
+        results[op] = {"count": len(samples), "ops_per_s": len(samples) / elapsed,
+                       "p50_ms": percentile(samples, 50), "p99_ms": percentile(samples, 99)}
+        r = results[op]
+        print(f"{op:<12} {r['count']:>7} {r['ops_per_s']:>9.0f} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        slower = [f"{op} p99 {results[op]['p99_ms']:.3f} ms vs {b['p99_ms']:.3f} ms"
+                  for op, b in baseline.items()
+                  if op in results and results[op]["count"] and results[op]["p99_ms"] > b["p99_ms"] * args.tolerance]
+        if slower:
+            raise SystemExit("REGRESSION: " + "; ".join(slower))
+        print(f"OK: every p99 is within {args.tolerance:.2f}x of {args.baseline}")
+
+def rebuild_rollups(args):
+    db = DatabaseManager(args.db)
+    start = time.perf_counter()
+    db.rebuild_rollups()
+    print(f"Rebuilt sales rollups in {time.perf_counter() - start:.2f}s")
+    db.close()
+
+def serve_api(args):
+    db = DatabaseManager(args.db)
+    receipts = ReceiptWriter(ReceiptArchive(args.db, args.receipts))
+    server = ServiceServer(RestaurantService(db, receipts), args.host, args.port, args.workers)
+    print(f"Serving the order API on http://{args.host}:{args.port} with {args.workers} workers (Ctrl+C to stop)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receipts.stop()
+        db.close()
+
+def batched(records, size):
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+def read_records(path):
+    # Yields one dict per row without loading the file: CSV with a header row,
+    # JSON Lines, or (loaded whole) a JSON array of objects.
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+def write_records(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        elif path.endswith((".jsonl", ".ndjson")):
+            for row in rows:
+                f.write(json.dumps(dict(zip(header, row))) + "\n")
+        else:
+            f.write("[")
+            for n, row in enumerate(rows):
+                f.write((",\n " if n else "\n ") + json.dumps(dict(zip(header, row))))
+            f.write("\n]\n")
+
+def import_data(args):
+    db = DatabaseManager(args.db)
+    start = time.perf_counter()
+    importer = {"categories": db.import_categories, "menu": db.import_menu,
+                "inventory": db.import_inventory, "recipes": db.import_recipes}[args.kind]
+    try:
+        result = importer(read_records(args.file))
+    except (KeyError, ValueError) as e:
+        db.close()
+        raise SystemExit(f"Import failed, nothing was changed: {e}")
+    print(f"Imported {args.kind} from {args.file} in {time.perf_counter() - start:.2f}s: "
+          f"{result['added']} added, {result['updated']} updated")
+    if "menu_items" in result:
+        print(f"Replaced the recipes of {result['menu_items']} menu items")
+    variances = result.get("variances")
+    if variances is not None:
+        print(f"{len(variances)} items differed from expected stock")
+        for name, expected, counted in variances[:args.show]:
+            print(f"  {name:<30} expected {expected:>8}  counted {counted:>8}  ({counted - expected:+})")
+        if args.variance:
+            write_records(args.variance, ("name", "expected", "counted"), variances)
+    db.close()
+
+def export_data(args):
+    db = DatabaseManager(args.db)
+    header, rows = db.export_rows(args.kind)
+    write_records(args.file, header, rows)
+    print(f"Exported {args.kind} to {args.file}")
+    db.close()
+
+def archive_orders(args):
+    db = DatabaseManager(args.db)
+    before = datetime.now() - timedelta(days=args.days)
+    start = time.perf_counter()
+    moved = db.archive_orders(before)
+    for month, orders, details in moved:
+        print(f"  {month}: {orders} orders, {details} lines -> {db.order_archive.path(month)}")
+    print(f"Archived {sum(m[1] for m in moved)} completed orders older than {before:%Y-%m-%d} "
+          f"in {time.perf_counter() - start:.2f}s")
+    if args.vacuum:
+        db.flush_inventory()
+        db.conn.execute("VACUUM")
+    db.close()
+
+def sales_history(args):
+    db = DatabaseManager(args.db)
+    rows = db.get_history_data("""
+        SELECT substr(o.timestamp, 1, 7), COUNT(DISTINCT o.id), SUM(od.quantity), SUM(od.quantity * od.unit_price)
+        FROM orders o JOIN order_details od ON od.order_id = o.id
+        WHERE o.timestamp >= ? AND o.timestamp < ? AND o.status = 'Completed' AND od.status != 'Void'
+        GROUP BY 1 ORDER BY 1
+    """, (args.start, args.end), args.start, args.end)
+    archived = set(db.order_archive.months(args.start, args.end))
+    print(f"{'Month':<9} {'Orders':>8} {'Items':>9} {'Sales':>12}  Source")
+    for month, orders, items, sales in rows:
+        print(f"{month:<9} {orders:>8} {items:>9} {sales or 0:>12,.2f}  {'archived' if month in archived else 'live'}")
+    db.close()
+
+def close_day(args):
+    db = DatabaseManager(args.db)
+    day = args.day or datetime.now().strftime("%Y-%m-%d")
+    start = time.perf_counter()
+    report = db.close_day(day)
+    path = write_z_report(report, args.out)
+    db.close()
+    print(f"Closed {day} in {time.perf_counter() - start:.2f}s: {report['orders']} orders, "
+          f"net {report['subtotal']:,.2f}, tax {report['tax']:,.2f}, total {report['total']:,.2f}")
+    if report["open_orders"]:
+        print(f"Warning: {report['open_orders']} orders from {day} are still open and are not in the totals")
+    print(f"Z report written to {path}")
+    if args.show:
+        with open(path, encoding="utf-8") as f:
+            print(f.read(), end="")
+
+def forecast_stock(args):
+    db = DatabaseManager(args.db)
+    start = time.perf_counter()
+    try:
+        suggestions = DemandForecaster(db).suggest(args.days, args.window, args.weeks, args.review_days, args.lead_days, args.z)
+    except ImportError as e:
+        db.close()
+        raise SystemExit(str(e))
+    db.close()
+    suggestions.sort(key=lambda s: (-s.order_quantity, s.name))
+    cover = args.review_days + args.lead_days
+    print(f"Forecast from {args.days} days of history in {time.perf_counter() - start:.2f}s; "
+          f"pars cover {cover} days ({args.review_days} review + {args.lead_days} lead)")
+    print(f"{'Ingredient':<24} {'On hand':>9} {'Avg/day':>9} {'MA':>9} {'Seasonal':>9} {'Safety':>8} {'Par':>8} {'Order':>8}")
+    for s in suggestions[:args.show] if args.show else suggestions:
+        print(f"{s.name[:24]:<24} {s.on_hand:>9} {s.daily_average:>9.1f} {s.moving_average:>9.1f} {s.seasonal:>9.1f} "
+              f"{s.safety_stock:>8.1f} {s.par_level:>8} {s.order_quantity:>8}")
+    print(f"{sum(1 for s in suggestions if s.order_quantity)} of {len(suggestions)} ingredients need ordering")
+    if args.out:
+        write_records(args.out, ParSuggestion._fields, suggestions)
+        print(f"Wrote suggestions to {args.out}")
+
+def bench_forecast(args):
+    path = os.path.join(tempfile.mkdtemp(), "forecast.db")
+    db = DatabaseManager(path)
+    db.seed_data()
+    start = time.perf_counter()
+    synthetic_restaurant(db, menu_items=args.menu_items, ingredients=args.ingredients, days=args.days,
+                         orders_per_day=args.orders_per_day, stock=args.stock, seed=args.seed)
+    lines = db.get_data("SELECT COUNT(*) FROM order_details")[0][0]
+    print(f"Built {args.days} days x {args.orders_per_day} orders ({lines} lines), {args.menu_items} menu items, "
+          f"{args.ingredients} ingredients in {time.perf_counter() - start:.1f}s ({path})")
+    if args.archive:
+        start = time.perf_counter()
+        moved = db.archive_orders(datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS))
+        print(f"Archived {sum(m[1] for m in moved)} orders into {len(moved)} monthly files in {time.perf_counter() - start:.1f}s")
+    try:
+        forecaster = DemandForecaster(db)
+    except ImportError as e:
+        db.close()
+        raise SystemExit(str(e))
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    timings = {"usage": [], "forecast": [], "suggest": []}
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        inv_ids, usage = forecaster.usage(today - timedelta(days=args.days), today)
+        timings["usage"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        forecaster.forecast(usage, today, FORECAST_REVIEW_DAYS + FORECAST_LEAD_DAYS)
+        timings["forecast"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        suggestions = forecaster.suggest(args.days, today=today)
+        timings["suggest"].append(time.perf_counter() - start)
+    db.close()
+    print(f"Usage matrix {usage.shape[0]} days x {usage.shape[1]} ingredients, "
+          f"{sum(1 for s in suggestions if s.order_quantity)} ingredients to order")
+    for op, samples in timings.items():
+        print(f"{op:<9} best {min(samples):.3f}s  worst {max(samples):.3f}s")
+
+def seed_database(args):
+    db = DatabaseManager(args.db)
+    if not db.seed_data():
+        print(f"{args.db} already has a menu; nothing seeded.")
+    db.close()
+
+def startup_probe(args):
+    # Runs in a fresh process for bench-startup. Without a display only the
+    # database part of startup can be timed.
+    start = time.perf_counter()
+    try:
+        app = RestaurantApp(db_name=args.db)
+    except tk.TclError:
+        db = DatabaseManager(args.db)
+        print(json.dumps({"phase": "database open", "ms": (time.perf_counter() - start) * 1000}))
+        db.close()
+        return
+    app.update()
+    print(json.dumps({"phase": "login screen", "ms": (time.perf_counter() - start) * 1000}))
+    app.notifier.stop()
+    app.receipts.stop()
+    app.db.close()
+    app.destroy()
+
+def bench_startup(args):
+    path = os.path.abspath(args.db) if args.db else os.path.join(tempfile.mkdtemp(), "startup.db")
+    print(f"{'Run':<5} {'Database':<10} {'Phase':<14} {'In-process (ms)':>16} {'Wall (ms)':>10}")
+    warm = []
+    for run in range(1, args.runs + 1):
+        state = "existing" if os.path.exists(path) else "new"
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "startup-probe", "--db", path],
+                             cwd=os.path.dirname(path), capture_output=True, text=True, check=True)
+        wall = (time.perf_counter() - start) * 1000
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{run:<5} {state:<10} {result['phase']:<14} {result['ms']:>16.1f} {wall:>10.1f}")
+        if state == "existing":
+            warm.append(result["ms"])
+    if warm:
+        print(f"Existing database: p50 {percentile(warm, 50):.1f} ms to {result['phase']}")
+
+def show_receipt(args):
+    text = ReceiptArchive(args.db, args.dir).lookup(args.order, args.day)
+    if text is None:
+        raise SystemExit(f"No archived receipt for order {args.order}")
+    print(text, end="")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gilded Fork Enterprise System")
+    parser.add_argument("--server", help="Send order entry through a running 'serve' API at this URL")
+    parser.add_argument("--terminal", help="Name this terminal's login session (defaults to the host name)")
+    commands = parser.add_subparsers(dest="command")
+
+    cmd = commands.add_parser("bench-indexes", help="Compare query latency before and after schema indexes")
+    cmd.add_argument("--days", type=int, default=365)
+    cmd.add_argument("--orders-per-day", type=int, default=150)
+    cmd.add_argument("--repeat", type=int, default=20)
+    cmd.set_defaults(func=bench_indexes)
+
+    cmd = commands.add_parser("stress-orders", help="Hammer order entry from several processes; exits non-zero on overselling or a lost update")
+    cmd.add_argument("--processes", type=int, default=8)
+    cmd.add_argument("--attempts", type=int, default=100)
+    cmd.add_argument("--stock", type=int, default=500)
+    cmd.set_defaults(func=stress_orders)
+
+    cmd = commands.add_parser("bench-assign", help="Replay service nights through the table-assignment optimizer")
+    cmd.add_argument("--night", action="append", help="Recorded night JSON file (repeatable)")
+    cmd.add_argument("--db", help="Build a night from this database's reservations")
+    cmd.add_argument("--day", default=datetime.now().strftime("%Y-%m-%d"))
+    cmd.add_argument("--tables", type=int, default=200)
+    cmd.add_argument("--parties", type=int, default=1000)
+    cmd.add_argument("--save", help="Write the (last) replayed night to this JSON file")
+    cmd.set_defaults(func=bench_assign)
+
+    cmd = commands.add_parser("rebuild-rollups", help="Recompute the admin sales rollups from order history")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.set_defaults(func=rebuild_rollups)
+
+    cmd = commands.add_parser("seed", help="Load the sample floor plan, menu, inventory and recipes into an empty database")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.set_defaults(func=seed_database)
+
+    cmd = commands.add_parser("archive-orders", help="Move old completed orders into per-month archive databases")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="Keep this many days of orders live")
+    cmd.add_argument("--vacuum", action="store_true", help="Compact the live database afterwards")
+    cmd.set_defaults(func=archive_orders)
+
+    cmd = commands.add_parser("sales-history", help="Monthly sales across live and archived orders")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.add_argument("--from", dest="start", default=f"{datetime.now().year - 1}-01-01")
+    cmd.add_argument("--to", dest="end", default=f"{datetime.now().year + 1}-01-01")
+    cmd.set_defaults(func=sales_history)
+
+    cmd = commands.add_parser("close-day", help="End-of-day close: snapshot the day's sales and usage and write a Z report")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.add_argument("--day", help="Business day to close as YYYY-MM-DD (default today)")
+    cmd.add_argument("--out", default=REPORT_DIR, help="Directory for the Z report file")
+    cmd.add_argument("--show", action="store_true", help="Print the report as well")
+    cmd.set_defaults(func=close_day)
+
+    cmd = commands.add_parser("forecast", help="Forecast ingredient usage from order history and suggest par levels and orders")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.add_argument("--days", type=int, default=FORECAST_HISTORY_DAYS, help="Days of history to read")
+    cmd.add_argument("--window", type=int, default=FORECAST_WINDOW_DAYS, help="Moving-average window in days")
+    cmd.add_argument("--weeks", type=int, default=FORECAST_SEASON_WEEKS, help="Weeks used for the day-of-week profile")
+    cmd.add_argument("--review-days", type=int, default=FORECAST_REVIEW_DAYS, help="Days until the next order after this one")
+    cmd.add_argument("--lead-days", type=int, default=FORECAST_LEAD_DAYS, help="Days from ordering to delivery")
+    cmd.add_argument("--z", type=float, default=FORECAST_SERVICE_Z, help="Safety factor (1.65 is about a 95%% service level)")
+    cmd.add_argument("--show", type=int, default=30, help="Rows to print (0 for all)")
+    cmd.add_argument("--out", help="Write every suggestion to this .csv, .jsonl or .json file")
+    cmd.set_defaults(func=forecast_stock)
+
+    cmd = commands.add_parser("import", help="Bulk-load categories, menu items, recipes or a stock count from CSV/JSON")
+    cmd.add_argument("kind", choices=("categories", "menu", "inventory", "recipes"))
+    cmd.add_argument("file", help=".csv with a header row, .jsonl, or .json array")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.add_argument("--variance", help="For a stock count, write the items that differed to this file")
+    cmd.add_argument("--show", type=int, default=20, help="Stock-count variances to print")
+    cmd.set_defaults(func=import_data)
+
+    cmd = commands.add_parser("export", help="Write categories, menu items, recipes or stock to CSV/JSON")
+    cmd.add_argument("kind", choices=("categories", "menu", "inventory", "recipes"))
+    cmd.add_argument("file")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.set_defaults(func=export_data)
+
+    cmd = commands.add_parser("bench-startup", help="Time startup to the login screen in fresh processes")
+    cmd.add_argument("--db", help="Database to open (default: a new scratch database, so run 1 includes schema creation)")
+    cmd.add_argument("--runs", type=int, default=5)
+    cmd.set_defaults(func=bench_startup)
+
+    cmd = commands.add_parser("startup-probe", help="Time one startup (used by bench-startup)")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.set_defaults(func=startup_probe)
+
+    cmd = commands.add_parser("serve", help="Run the order, table, kitchen and inventory API over HTTP/JSON")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.add_argument("--host", default=SERVICE_HOST)
+    cmd.add_argument("--port", type=int, default=SERVICE_PORT)
+    cmd.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    cmd.add_argument("--receipts", help="Receipt archive directory (default: receipts/ beside the database)")
+    cmd.set_defaults(func=serve_api)
+
+    cmd = commands.add_parser("receipt", help="Print an archived receipt by order id")
+    cmd.add_argument("order", type=int)
+    cmd.add_argument("--day", help="Archive day (YYYY-MM-DD); searches newest first when omitted")
+    cmd.add_argument("--db", default=DB_NAME)
+    cmd.add_argument("--dir", help="Receipt archive directory (default: receipts/ beside the database)")
+    cmd.set_defaults(func=show_receipt)
+
+    cmd = commands.add_parser("bench-reservations", help="Time best-table lookups against thousands of future bookings")
+    cmd.add_argument("--tables", type=int, default=120)
+    cmd.add_argument("--bookings", type=int, default=5000)
+    cmd.add_argument("--days", type=int, default=30)
+    cmd.add_argument("--queries", type=int, default=10000)
+    cmd.set_defaults(func=bench_reservations)
+
+    cmd = commands.add_parser("bench-kitchen", help="Time the scheduled KDS query and per-item bumps with many open tickets")
+    cmd.add_argument("--tickets", type=int, default=150)
+    cmd.add_argument("--items", type=int, default=5)
+    cmd.add_argument("--repeat", type=int, default=200)
+    cmd.add_argument("--seed", type=int, default=7)
+    cmd.set_defaults(func=bench_kitchen)
+
+    cmd = commands.add_parser("bench-logins", help="Time concurrent logins against the salted password KDF")
+    cmd.add_argument("--users", type=int, default=50)
+    cmd.add_argument("--terminals", type=int, default=8, help="Terminals logging in at once")
+    cmd.add_argument("--logins", type=int, default=25, help="Logins per terminal")
+    cmd.add_argument("--iterations", type=int, default=PASSWORD_ITERATIONS)
+    cmd.add_argument("--workers", type=int, default=LOGIN_WORKERS)
+    cmd.add_argument("--budget-ms", type=float, default=LOGIN_BUDGET_MS, help="Fail if the p99 login is slower than this")
+    cmd.add_argument("--seed", type=int, default=7)
+    cmd.set_defaults(func=bench_logins)
+
+    cmd = commands.add_parser("bench-close", help="Time the end-of-day close on a synthetic busy day")
+    cmd.add_argument("--orders", type=int, default=5000)
+    cmd.add_argument("--items", type=int, default=4, help="Lines per order")
+    cmd.add_argument("--menu-items", type=int, default=300)
+    cmd.add_argument("--history-days", type=int, default=30)
+    cmd.add_argument("--servers", type=int, default=12)
+    cmd.add_argument("--runs", type=int, default=3)
+    cmd.add_argument("--budget-s", type=float, default=5.0, help="Fail if any close is slower than this")
+    cmd.add_argument("--seed", type=int, default=7)
+    cmd.set_defaults(func=bench_close)
+
+    cmd = commands.add_parser("bench-forecast", help="Time the demand forecast over years of synthetic history")
+    cmd.add_argument("--days", type=int, default=730)
+    cmd.add_argument("--orders-per-day", type=int, default=150)
+    cmd.add_argument("--menu-items", type=int, default=300)
+    cmd.add_argument("--ingredients", type=int, default=400)
+    cmd.add_argument("--stock", type=int, default=60, help="Starting quantity of every ingredient")
+    cmd.add_argument("--archive", action="store_true", help="Archive orders older than 90 days first, so history spans archive files")
+    cmd.add_argument("--runs", type=int, default=3)
+    cmd.add_argument("--seed", type=int, default=7)
+    cmd.set_defaults(func=bench_forecast)
+
+    cmd = commands.add_parser("bench-service", help="Replay a dinner rush against a synthetic restaurant without the GUI")
+    cmd.add_argument("--tables", type=int, default=120)
+    cmd.add_argument("--menu-items", type=int, default=300)
+    cmd.add_argument("--ingredients", type=int, default=400)
+    cmd.add_argument("--days", type=int, default=365)
+    cmd.add_argument("--orders-per-day", type=int, default=150)
+    cmd.add_argument("--servers", type=int, default=8)
+    cmd.add_argument("--tickets", type=int, default=25, help="Tickets opened and paid per server")
+    cmd.add_argument("--items", type=int, default=4, help="Items added per ticket")
+    cmd.add_argument("--cooks", type=int, default=2)
+    cmd.add_argument("--kitchen-ms", type=int, default=50, help="Pause between KDS refreshes per cook")
+    cmd.add_argument("--seed", type=int, default=7)
+    cmd.add_argument("--api", action="store_true", help="Go through the HTTP API instead of calling the service directly")
+    cmd.add_argument("--save", help="Write the per-operation results to this JSON file")
+    cmd.add_argument("--baseline", help="Fail if any p99 is worse than this saved result by more than --tolerance")
+    cmd.add_argument("--tolerance", type=float, default=1.5)
+    cmd.add_argument("--metrics", help="Export per-statement query metrics from the rush to this JSON file")
+    cmd.set_defaults(func=bench_service)
+
+    cmd = commands.add_parser("bench-concurrency", help="Concurrent POS writes and KDS reads, rollback journal vs WAL")
+    cmd.add_argument("--writers", type=int, default=4)
+    cmd.add_argument("--readers", type=int, default=4)
+    cmd.add_argument("--seconds", type=float, default=3.0)
+    cmd.set_defaults(func=bench_concurrency)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        app = RestaurantApp(args.server, terminal=args.terminal)
+        app.mainloop()
+        app.sessions.close()
+        if app.receipts:
+            app.receipts.stop()
+        app.db.close()
+    else:
+        args.func(args)
 
 if __name__ == "__main__":
-    app = RestaurantApp()
-    app.mainloop()
+    main()